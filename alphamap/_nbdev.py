@@ -2,41 +2,123 @@
 
 __all__ = ["index", "modules", "custom_doc_links", "git_url"]
 
-index = {"read_file": "Importing.ipynb",
+index = {"read_file_chunks": "Importing.ipynb",
+         "read_file": "Importing.ipynb",
+         "combine_chunks": "Importing.ipynb",
+         "apply_to_unique": "Importing.ipynb",
          "extract_rawfile_unique_values": "Importing.ipynb",
          "import_spectronaut_data": "Importing.ipynb",
          "import_maxquant_data": "Importing.ipynb",
+         "find_modification_by_mass": "Importing.ipynb",
+         "find_modification_by_unimod": "Importing.ipynb",
+         "find_modification_by_alphapept": "Importing.ipynb",
+         "format_modification": "Importing.ipynb",
+         "get_ptm_shape": "Importing.ipynb",
+         "modification_registry": "Importing.ipynb",
+         "modification_unimod_dict": "Importing.ipynb",
+         "modification_alphapept_dict": "Importing.ipynb",
+         "modification_shape_dict": "Importing.ipynb",
+         "modification_mass_index": "Importing.ipynb",
+         "modification_mass_names": "Importing.ipynb",
          "convert_ap_mq_mod": "Importing.ipynb",
+         "convert_ap_mq_mod_batch": "Importing.ipynb",
+         "ap_modif_residue_dict": "Importing.ipynb",
+         "ap_modif_regex": "Importing.ipynb",
          "import_alphapept_data": "Importing.ipynb",
          "convert_diann_mq_mod": "Importing.ipynb",
+         "convert_diann_mq_mod_batch": "Importing.ipynb",
+         "diann_modif_regex": "Importing.ipynb",
          "import_diann_data": "Importing.ipynb",
          "convert_fragpipe_mq_mod": "Importing.ipynb",
          "import_fragpipe_data": "Importing.ipynb",
          "import_data": "Importing.ipynb",
          "extract_uniprot_id": "Preprocessing.ipynb",
          "expand_protein_ids": "Preprocessing.ipynb",
+         "get_protein_sequence": "Preprocessing.ipynb",
+         "find_peptide_positions": "Preprocessing.ipynb",
          "pep_position_helper": "Preprocessing.ipynb",
          "get_peptide_position": "Preprocessing.ipynb",
          "get_ptm_sites": "Preprocessing.ipynb",
          "get_modifications": "Preprocessing.ipynb",
          "format_input_data": "Preprocessing.ipynb",
+         "get_default_cache_dir": "Preprocessing.ipynb",
+         "clear_cache": "Preprocessing.ipynb",
+         "get_file_fingerprint": "Preprocessing.ipynb",
+         "get_cache_key": "Preprocessing.ipynb",
+         "import_formatted_data": "Preprocessing.ipynb",
+         "cache_format_version": "Preprocessing.ipynb",
+         "cache_max_size": "Preprocessing.ipynb",
+         "get_protein_index": "Preprocessing.ipynb",
+         "get_protein_data": "Preprocessing.ipynb",
          "format_uniprot_annotation": "SequencePlot.ipynb",
+         "get_uniprot_index": "SequencePlot.ipynb",
+         "get_protein_annotation": "SequencePlot.ipynb",
          "ptm_shape_dict": "SequencePlot.ipynb",
          "get_plot_data": "SequencePlot.ipynb",
+         "LRUCache": "SequencePlot.ipynb",
+         "get_cached_plot_data": "SequencePlot.ipynb",
+         "plot_data_cache": "SequencePlot.ipynb",
+         "get_scatter_trace": "SequencePlot.ipynb",
+         "get_sequence_tick_levels": "SequencePlot.ipynb",
+         "get_sequence_ticks": "SequencePlot.ipynb",
+         "update_sequence_axis": "SequencePlot.ipynb",
+         "link_sequence_axis": "SequencePlot.ipynb",
          "plot_single_peptide_traces": "SequencePlot.ipynb",
+         "webgl_point_threshold": "SequencePlot.ipynb",
+         "max_sequence_ticks": "SequencePlot.ipynb",
+         "sequence_tick_levels_cache": "SequencePlot.ipynb",
          "custom_color_palettes": "SequencePlot.ipynb",
          "uniprot_color_dict": "SequencePlot.ipynb",
          "aa_color_dict": "SequencePlot.ipynb",
+         "get_feature_track_segments": "SequencePlot.ipynb",
          "plot_peptide_traces": "SequencePlot.ipynb",
+         "export_report_figures": "SequencePlot.ipynb",
+         "get_report_key": "SequencePlot.ipynb",
+         "stream_pdf_report": "SequencePlot.ipynb",
+         "remove_old_reports": "SequencePlot.ipynb",
          "create_pdf_report": "SequencePlot.ipynb",
+         "report_footer_text": "SequencePlot.ipynb",
          "extract_note": "Uniprot_integration.ipynb",
          "extract_note_end": "Uniprot_integration.ipynb",
          "resolve_unclear_position": "Uniprot_integration.ipynb",
          "extract_positions": "Uniprot_integration.ipynb",
+         "find_uniprot_entries": "Uniprot_integration.ipynb",
+         "split_uniprot_entries": "Uniprot_integration.ipynb",
+         "read_uniprot_blocks": "Uniprot_integration.ipynb",
+         "read_uniprot_entries": "Uniprot_integration.ipynb",
+         "parse_position": "Uniprot_integration.ipynb",
+         "parse_note": "Uniprot_integration.ipynb",
+         "parse_uniprot_entries": "Uniprot_integration.ipynb",
+         "get_uniprot_shards": "Uniprot_integration.ipynb",
+         "parse_uniprot_file_parallel": "Uniprot_integration.ipynb",
+         "format_uniprot_columns": "Uniprot_integration.ipynb",
          "preprocess_uniprot": "Uniprot_integration.ipynb",
+         "uniprot_feature_regex": "Uniprot_integration.ipynb",
+         "uniprot_accession_regex": "Uniprot_integration.ipynb",
+         "uniprot_note_regex": "Uniprot_integration.ipynb",
+         "get_uniprot_entry_checksum": "Uniprot_integration.ipynb",
+         "get_uniprot_checksum_file": "Uniprot_integration.ipynb",
+         "update_uniprot_annotation": "Uniprot_integration.ipynb",
+         "uniprot_version_regex": "Uniprot_integration.ipynb",
          "uniprot_feature_dict": "Uniprot_integration.ipynb",
          "all_organisms": "organisms_data.ipynb",
+         "get_fasta_index_files": "organisms_data.ipynb",
+         "build_fasta_index": "organisms_data.ipynb",
+         "load_fasta_index": "organisms_data.ipynb",
+         "import_indexed_fasta": "organisms_data.ipynb",
+         "get_proteome": "organisms_data.ipynb",
+         "get_sequence": "organisms_data.ipynb",
+         "get_description": "organisms_data.ipynb",
+         "get_protein_table": "organisms_data.ipynb",
+         "fasta_index_version": "organisms_data.ipynb",
          "import_fasta": "organisms_data.ipynb",
+         "get_uniprot_annotation_files": "organisms_data.ipynb",
+         "encode_uniprot_annotation": "organisms_data.ipynb",
+         "decode_uniprot_annotation": "organisms_data.ipynb",
+         "build_uniprot_annotation": "organisms_data.ipynb",
+         "load_uniprot_annotation": "organisms_data.ipynb",
+         "uniprot_annotation_version": "organisms_data.ipynb",
+         "uniprot_annotation_columns": "organisms_data.ipynb",
          "import_uniprot_annotation": "organisms_data.ipynb",
          "protease_dict": "proteolytic_cleavage.ipynb",
          "get_cleavage_sites": "proteolytic_cleavage.ipynb"}
@@ -6,7 +6,9 @@ import platform
 import urllib.request
 import shutil
 import re
+import tempfile
 import sys
+import threading
 import numpy as np
 import pandas as pd
 from io import StringIO
@@ -15,24 +17,32 @@ import pyteomics.fasta
 import panel as pn
 import plotly.graph_objects as go
 # local
-from alphamap.importing import import_data, extract_rawfile_unique_values
-from alphamap.preprocessing import format_input_data
-from alphamap.sequenceplot import plot_peptide_traces, uniprot_color_dict, create_pdf_report
+from alphamap.importing import extract_rawfile_unique_values
+from alphamap.preprocessing import import_formatted_data, get_protein_index
+from alphamap.sequenceplot import plot_peptide_traces, uniprot_color_dict, create_pdf_report, remove_old_reports, update_sequence_axis, get_uniprot_index
+from alphamap.sequenceplot import LRUCache, plot_data_cache
 from alphamap.uniprot_integration import uniprot_feature_dict
 from alphamap.proteolytic_cleavage import protease_dict
-from alphamap.organisms_data import all_organisms, import_fasta, import_uniprot_annotation
+from alphamap.organisms_data import all_organisms, import_fasta, import_uniprot_annotation, get_protein_table, get_description, get_sequence
 
 
 # LOCAL VARIABLES
 full_fasta = None
 full_uniprot = None
+full_gene_names = None
 ac_gene_conversion = None
 SETTINGS = {
     'max_file_size_gb': 50,
-    'max_num_proteins_report': 100
+    'report_dir': os.path.join(tempfile.gettempdir(), 'alphamap_reports'),
+    'report_max_age_hours': 24,
+    'plot_data_cache_size_mb': 256,
+    'figure_cache_size_mb': 512
 }
 SERVER = None
 TAB_COUNTER = 0
+# caches of the per-protein plot data and of the dashboard figures, the figure cache is cleared on every upload
+plot_data_cache.max_bytes = SETTINGS['plot_data_cache_size_mb'] * 1024**2
+figure_cache = LRUCache(max_bytes=SETTINGS['figure_cache_size_mb'] * 1024**2)
 
 # ERROR/WARNING MESSAGES
 error_message_upload = "The selected {}file can't be uploaded. Please check the instructions for data uploading."
@@ -40,7 +50,7 @@ error_message_extract_samples = "It is impossible to extract raw file names from
 error_message_no_file = "The selected {}file is not found. Please check whether the specified path is correct."
 error_message_upload_wrong_columns = "The columns necessary for further analysis cannot be extracted from the {} experimental file. Please check the data uploading instructions for a particular software tool."
 error_message_size = f"A maximum file size shouldn't exceed {SETTINGS['max_file_size_gb']} GB."
-error_message_report_long = f"Only first {SETTINGS['max_num_proteins_report']} proteins will be presented in the report."
+error_message_report = "The PDF report can't be created: {}"
 
 if platform.system() == 'Windows':
     filepath_placeholder = 'D:\data\output_alphapept.csv'
@@ -163,6 +173,14 @@ search_by = pn.widgets.RadioBoxGroup(
     options=['Search by UniProt accession', 'Search by a gene name'],
     value='Search by UniProt accession'
 )
+render_mode = pn.widgets.RadioBoxGroup(
+    name='Rendering',
+    options=['auto', 'svg', 'webgl'],
+    value='auto',
+    inline=True,
+    align='center',
+    margin=(0,0,0,20)
+)
 select_all = pn.widgets.Checkbox(
     name='Select all',
     width=150
@@ -357,8 +375,39 @@ visualize_spinner = pn.indicators.LoadingSpinner(
 )
 
 
-def download_pdf_report():
+create_pdf_button = pn.widgets.Button(
+    name='PDF for a list of pre-selected proteins',
+    disabled=True,
+    button_type='default',
+    height=31,
+    width=390,
+    margin=(5, 10, 0, 6),
+)
+
+download_pdf = pn.widgets.FileDownload(
+    label='Download the PDF report',
+    disabled=True,
+    filename='alphamap_pdf_report.pdf',
+    button_type='default',
+    height=31,
+    width=369,
+    margin=(5, 20, 0, 20),
+)
+
+# state of the pdf report that is created in the background, see create_pdf_report_in_background
+report_state = None
+
+
+@pn.depends(
+    create_pdf_button.param.clicks,
+    watch=True
+)
+def create_pdf_report_in_background(clicks):
+    global report_state
     download_pdf_error.object = ''
+    download_pdf_progress.value = 0
+    download_pdf.disabled = True
+    create_pdf_button.disabled = True
     download_pdf_loading_spinner.value = True
     uniprot_options_combined = sum([each.value for each in uniprot_options.objects if each.value], [])
     # extract all experimental data and names
@@ -396,10 +445,11 @@ def download_pdf_report():
         all_data = all_data[0]
         all_names = all_names[0]
     proteins_in_report = list(ac_gene_conversion.keys())
-    if len(proteins_in_report) > SETTINGS['max_num_proteins_report']:
-        download_pdf_error.object = error_message_report_long
-        proteins_in_report = proteins_in_report[:SETTINGS['max_num_proteins_report']]
-    report = create_pdf_report(
+    # the report is streamed to disk page by page into a file named after its data and options,
+    # so parallel reports never share a file and an interrupted report with the same data and options is resumed
+    os.makedirs(SETTINGS['report_dir'], exist_ok=True)
+    remove_old_reports(SETTINGS['report_dir'], max_age=SETTINGS['report_max_age_hours'] * 3600)
+    report_args = dict(
         proteins = proteins_in_report,
         df = all_data,
         name = all_names,
@@ -408,23 +458,58 @@ def download_pdf_report():
         selected_features=[uniprot_feature_dict[each] for each in uniprot_options_combined],
         uniprot_feature_dict=uniprot_feature_dict,
         uniprot_color_dict=uniprot_color_dict,
-        selected_proteases=proteases_options.value
+        selected_proteases=proteases_options.value,
+        output_file=SETTINGS['report_dir']
     )
+    state = {
+        'n_done': 0,
+        'n_total': len(proteins_in_report),
+        'file': None,
+        'previous_file': report_state['file'] if report_state is not None else None,
+        'error': None,
+        'finished': False
+    }
+
+    def update_state(n_done, n_total):
+        state['n_done'], state['n_total'] = n_done, n_total
+
+    def create_report():
+        try:
+            state['file'] = create_pdf_report(progress_callback=update_state, **report_args)
+        except Exception as e:
+            state['error'] = e
+        state['finished'] = True
+
+    # the widgets are only changed by the periodic callback of the server, the report thread only updates the state
+    report_state = state
+    threading.Thread(target=create_report, daemon=True).start()
+    state['callback'] = pn.state.add_periodic_callback(lambda: update_report_progress(state), period=500)
+
+
+def update_report_progress(state):
+    if state is not report_state:
+        # the dashboard was cleared or a new report was started
+        state['callback'].stop()
+        return
+    download_pdf_progress.max = max(state['n_total'], 1)
+    download_pdf_progress.value = state['n_done']
+    if not state['finished']:
+        return
+    state['callback'].stop()
     download_pdf_loading_spinner.value = False
-    return report
+    create_pdf_button.disabled = False
+    if state['error'] is not None:
+        download_pdf_error.object = error_message_report.format(state['error'])
+        return
+    download_pdf.file = state['file']
+    # the report file is named after its key, the downloaded file keeps the name of the former reports
+    download_pdf.filename = 'alphamap_pdf_report.pdf'
+    download_pdf.disabled = False
+    # the previous report of the dashboard is replaced by the new one
+    if state['previous_file'] not in [None, state['file']]:
+        remove_old_reports(SETTINGS['report_dir'], reports=[state['previous_file']])
 
 
-download_pdf = pn.widgets.FileDownload(
-    callback=download_pdf_report,
-    label='PDF for a list of pre-selected proteins',
-    disabled=True,
-    filename='alphamap_pdf_report.pdf',
-    button_type='default',
-    height=31,
-    width=390,
-    margin=(5, 10, 0, 6),
-)
-
 download_pdf_loading_spinner = pn.indicators.LoadingSpinner(
     value=False,
     bgcolor='light',
@@ -434,6 +519,13 @@ download_pdf_loading_spinner = pn.indicators.LoadingSpinner(
     height=30
 )
 
+download_pdf_progress = pn.indicators.Progress(
+    value=0,
+    max=100,
+    width=369,
+    margin=(5, 20, 20, 20)
+)
+
 download_pdf_error = pn.pane.Alert(
     width=369,
     margin=(-22, 20, 20, 20),
@@ -908,16 +1000,13 @@ def upload_experimental_data():
         else:
             data_samples = experimental_data_sample.value
         try:
-            preprocessed_exp_data.value = format_input_data(
-                df = import_data(
-                    experimental_data.value.replace("\\", "/").replace('"', ''),
-                    verbose=False,
-                    sample=data_samples
-                ),
+            preprocessed_exp_data.value = import_formatted_data(
+                experimental_data.value.replace("\\", "/").replace('"', ''),
                 fasta = full_fasta,
                 modification_exp = r'\[.*?\]',
+                sample = data_samples,
                 verbose = False)
-            all_unique_proteins.extend(preprocessed_exp_data.value.unique_protein_id.unique().tolist())
+            all_unique_proteins.extend(get_protein_index(preprocessed_exp_data.value)[1].keys())
         except (TypeError, MemoryError, FileNotFoundError, ValueError, AttributeError) as e:
             if type(e).__name__ == 'MemoryError':
                 upload_data_warning.object = error_message_size
@@ -932,16 +1021,13 @@ def upload_experimental_data():
         else:
             data_2_samples = experimental_data_2_sample.value
         try:
-            preprocessed_exp_data_2.value = format_input_data(
-                df = import_data(
-                    experimental_data_2.value.replace("\\", "/").replace('"', ''),
-                    verbose=False,
-                    sample=data_2_samples
-                ),
+            preprocessed_exp_data_2.value = import_formatted_data(
+                experimental_data_2.value.replace("\\", "/").replace('"', ''),
                 fasta = full_fasta,
                 modification_exp = r'\[.*?\]',
+                sample = data_2_samples,
                 verbose = False)
-            all_unique_proteins.extend(preprocessed_exp_data_2.value.unique_protein_id.unique().tolist())
+            all_unique_proteins.extend(get_protein_index(preprocessed_exp_data_2.value)[1].keys())
         except (TypeError, MemoryError, FileNotFoundError, ValueError,
         AttributeError) as e:
             if not upload_data_warning.object:
@@ -958,16 +1044,13 @@ def upload_experimental_data():
         else:
             data_3_samples = experimental_data_3_sample.value
         try:
-            preprocessed_exp_data_3.value = format_input_data(
-                df = import_data(
-                    experimental_data_3.value.replace("\\", "/").replace('"', ''),
-                    verbose=False,
-                    sample=data_3_samples
-                ),
+            preprocessed_exp_data_3.value = import_formatted_data(
+                experimental_data_3.value.replace("\\", "/").replace('"', ''),
                 fasta = full_fasta,
                 modification_exp = r'\[.*?\]',
+                sample = data_3_samples,
                 verbose = False)
-            all_unique_proteins.extend(preprocessed_exp_data_3.value.unique_protein_id.unique().tolist())
+            all_unique_proteins.extend(get_protein_index(preprocessed_exp_data_3.value)[1].keys())
         except (TypeError, MemoryError, FileNotFoundError, ValueError, AttributeError) as e:
             if not upload_data_warning.object:
                 if type(e).__name__ == 'MemoryError':
@@ -978,7 +1061,7 @@ def upload_experimental_data():
                     upload_data_warning.object = error_message_no_file.format('third experimental ')
             upload_spinner.value = False
     ac_gene_conversion = {
-        each: f"{full_fasta.get_by_id(each).description.get('GN')} ({full_fasta.get_by_id(each).description.get('id')})" \
+        each: f"{full_gene_names.get(each)} ({each})" \
         for each in sorted(list(set(all_unique_proteins)))}
     # to set a selection list of availible proteins depending which user wants to search by
     if search_by.value == 'Search by a gene name':
@@ -993,7 +1076,7 @@ def upload_experimental_data():
 )
 def filter_proteins(data):
     if data:
-        download_pdf.disabled=False
+        create_pdf_button.disabled=False
         global ac_gene_conversion
         predefined_list = []
         for line in StringIO(str(data, "utf-8")).readlines():
@@ -1006,10 +1089,14 @@ def filter_proteins(data):
 
 
 def upload_organism_info():
-    global full_fasta, full_uniprot
+    global full_fasta, full_uniprot, full_gene_names
 
     full_fasta = import_fasta(select_organism.value)
+    protein_table = get_protein_table(full_fasta)
+    full_gene_names = dict(zip(protein_table.protein_id, protein_table.gene))
     full_uniprot = import_uniprot_annotation(select_organism.value)
+    # the annotation is formatted and indexed by protein once per organism instead of on every plot
+    get_uniprot_index(full_uniprot, uniprot_feature_dict)
 
 
 def natural_sort(l):
@@ -1047,6 +1134,24 @@ def extract_name(filename, sample, sample_name, sample_name_remove_prefix):
     return name
 
 
+def estimate_figure_size(fig):
+    # about 100 bytes per plotted point for the coordinates, texts and marker properties of a trace
+    n_points = sum([len(trace.x) for trace in fig.data if trace.x is not None])
+    return 100 * n_points + 10 * 1024
+
+
+def extract_x_range(relayout_data):
+    # the sequence axis (xaxis) and the position axis (xaxis2) are matched, so either of them gives the visible range
+    for axis in ['xaxis', 'xaxis2']:
+        if f'{axis}.range[0]' in relayout_data:
+            return [relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']]
+        if f'{axis}.range' in relayout_data:
+            return list(relayout_data[f'{axis}.range'])
+        if relayout_data.get(f'{axis}.autorange'):
+            return None
+    raise KeyError('The x range is not changed.')
+
+
 @pn.depends(
     experimental_data_sample_name.param.value,
     experimental_data_2_sample_name.param.value,
@@ -1064,10 +1169,9 @@ def extract_name(filename, sample, sample_name, sample_name_remove_prefix):
     watch=True
 )
 def clear_dashboard(*args):
-    global download_pdf
+    global download_pdf, report_state
     download_pdf = pn.widgets.FileDownload(
-        callback=download_pdf_report,
-        label='PDF for a list of pre-selected proteins',
+        label='Download the PDF report',
         filename='alphamap_pdf_report.pdf',
         disabled=True,
         button_type='default',
@@ -1076,10 +1180,15 @@ def clear_dashboard(*args):
         margin=(5, 20, 15, 12),
         align='center'
     )
+    # a report that is still created in the background doesn't update the cleared dashboard
+    report_state = None
+    create_pdf_button.disabled = True
+    download_pdf_loading_spinner.value = False
     upload_button.clicks = 0
     visualize_button.clicks = 0
     predefined_protein_list.value = None
     download_pdf_error.object = ''
+    download_pdf_progress.value = 0
     upload_data
     visualize_plot
 
@@ -1293,6 +1402,7 @@ def upload_data(clicks):
     ):
         upload_spinner.value = True
         select_protein.value = None
+        figure_cache.clear()
         # preload the data
         upload_organism_info()
         upload_experimental_data()
@@ -1306,9 +1416,11 @@ def upload_data(clicks):
                         predefined_protein_list_titel,
                         predefined_protein_list,
                         pn.Row(
-                            download_pdf,
+                            create_pdf_button,
                             download_pdf_loading_spinner
                         ),
+                        download_pdf,
+                        download_pdf_progress,
                         download_pdf_error
                     ),
                     pn.layout.VSpacer(width=80),
@@ -1322,6 +1434,7 @@ def upload_data(clicks):
                 pn.Row(
                     visualize_button,
                     visualize_spinner,
+                    render_mode,
                     align='center'
                 ),
                 divider,
@@ -1385,34 +1498,64 @@ def visualize_plot(clicks):
         except IndexError:
             visualize_spinner.value = False
             return None
-        # create a main figure
-        fig =  plot_peptide_traces(
-            df = all_data,
-            name = all_names,
-            protein = selected_protein,
-            fasta = full_fasta,
-            uniprot = full_uniprot,
-            selected_features = [uniprot_feature_dict[each] for each in uniprot_options_combined],
-            uniprot_feature_dict = uniprot_feature_dict,
-            uniprot_color_dict = uniprot_color_dict,
-            selected_proteases=proteases_options.value,
-            dashboard=True
+        # the cache key covers all options of the figure, the datasets are covered by clearing the cache on upload
+        selected_proteases = sorted(proteases_options.value)
+        figure_key = (
+            selected_protein,
+            str(all_names),
+            tuple(uniprot_options_combined),
+            tuple(selected_proteases),
+            protease_dict['custom_enzyme'] if 'custom_enzyme' in selected_proteases else None,
+            render_mode.value
+        )
+        fig = figure_cache.get(figure_key)
+        if fig is None:
+            # create a main figure
+            fig =  plot_peptide_traces(
+                df = all_data,
+                name = all_names,
+                protein = selected_protein,
+                fasta = full_fasta,
+                uniprot = full_uniprot,
+                selected_features = [uniprot_feature_dict[each] for each in uniprot_options_combined],
+                uniprot_feature_dict = uniprot_feature_dict,
+                uniprot_color_dict = uniprot_color_dict,
+                selected_proteases=selected_proteases,
+                dashboard=True,
+                render_mode=render_mode.value
+            )
+            # the cached figure always shows the complete sequence
+            update_sequence_axis(fig, get_sequence(full_fasta, selected_protein))
+            figure_cache.put(figure_key, fig, estimate_figure_size(fig))
+        protein_sequence = get_sequence(full_fasta, selected_protein)
+        # the plot gets its own copy of the cached figure, so zooming doesn't change the cached figure
+        plot_fig = go.Figure(fig)
+        plot_pane = pn.Pane(
+            plot_fig,
+            config={'toImageButtonOptions':
+                       {'format': 'svg', # one of png, svg, jpeg, webp
+                        'filename': f"alphamap_{get_description(full_fasta, selected_protein)['name']}_{get_description(full_fasta, selected_protein)['id']}",
+                        'height': 500,
+                        'width': 1500,
+                        'scale': 1 # Multiply title/legend/axis/canvas sizes by this factor
+                       }
+                   },
+            align='center',
+            sizing_mode='stretch_width',
+            # width=1500
         )
+        # the sequence axis starts with coarse ticks, the residue letters are added when zooming in
+        @pn.depends(plot_pane.param.relayout_data, watch=True)
+        def zoom_sequence_axis(relayout_data):
+            try:
+                x_range = extract_x_range(relayout_data or {})
+            except KeyError:
+                return
+            # the Plotly pane triggers its 'object' parameter when its figure is updated in place, so only the changed
+            # layout is sent to the browser
+            update_sequence_axis(plot_fig, protein_sequence, x_range)
         plot =  pn.Column(
-            pn.Pane(
-                fig,
-                config={'toImageButtonOptions':
-                           {'format': 'svg', # one of png, svg, jpeg, webp
-                            'filename': f"alphamap_{full_fasta[selected_protein].description['name']}_{full_fasta[selected_protein].description['id']}",
-                            'height': 500,
-                            'width': 1500,
-                            'scale': 1 # Multiply title/legend/axis/canvas sizes by this factor
-                           }
-                       },
-                align='center',
-                sizing_mode='stretch_width',
-                # width=1500
-            ),
+            plot_pane,
             visualize_buttons,
             align='center',
             sizing_mode='stretch_width'
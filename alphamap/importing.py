@@ -1,29 +1,52 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/Importing.ipynb (unless otherwise specified).
 
-__all__ = ['read_file', 'extract_rawfile_unique_values', 'import_spectronaut_data', 'import_maxquant_data',
-           'convert_ap_mq_mod', 'import_alphapept_data', 'convert_diann_mq_mod', 'import_diann_data',
+__all__ = ['read_file_chunks', 'read_file', 'combine_chunks', 'apply_to_unique', 'extract_rawfile_unique_values',
+           'import_spectronaut_data', 'import_maxquant_data', 'find_modification_by_mass',
+           'find_modification_by_unimod', 'find_modification_by_alphapept', 'format_modification', 'get_ptm_shape',
+           'modification_registry', 'modification_unimod_dict', 'modification_alphapept_dict',
+           'modification_shape_dict', 'modification_mass_index', 'modification_mass_names', 'convert_ap_mq_mod',
+           'convert_ap_mq_mod_batch', 'ap_modif_residue_dict', 'ap_modif_regex', 'import_alphapept_data',
+           'convert_diann_mq_mod', 'convert_diann_mq_mod_batch', 'diann_modif_regex', 'import_diann_data',
            'convert_fragpipe_mq_mod', 'import_fragpipe_data', 'import_data']
 
 # Cell
 import os
+import re
+import csv
+import numpy as np
 import pandas as pd
+from io import StringIO
+from itertools import islice
+from typing import Union
 
-def read_file(
+def read_file_chunks(
     file: str,
-    column_names: list
-) -> pd.DataFrame:
-    """Load a specified columns of the file as a pandas dataframe.
+    column_names: list,
+    sample: Union[str, list, None] = None,
+    sample_column: Union[str, None] = None,
+    chunk_size: int = 1000000,
+    quoting: int = csv.QUOTE_NONE
+):
+    """Stream specified columns of the file as pandas dataframes of a bounded size.
+
+    The header of the file is read only once and only the specified columns are kept, so the memory usage is limited
+    by the chunk size and not by the size of the file. If samples are specified, the lines of all other samples are
+    discarded before they are parsed.
 
     Args:
         file (str): The name of a file.
-        column_names (list): The list of three columns that should be extracted from the file.
+        column_names (list): The list of columns that should be extracted from the file.
+        sample (Union[str, list, None]): The unique raw file name(s) to filter the file. Defaults to None. In this case data for all raw files will be extracted.
+        sample_column (Union[str, None]): The column containing the raw file names. Must be specified if sample is not None. Defaults to None.
+        chunk_size (int): The maximum number of lines read for a single chunk. Defaults to 1000000.
+        quoting (int): The quoting behaviour of the csv module used to parse the file. Defaults to csv.QUOTE_NONE.
 
     Raises:
         NotImplementedError: if a specified file has not a .csv, .txt or .tsv extension.
         ValueError: if any of the specified columns is not in the file.
 
-    Returns:
-        pd.DataFrame: A pandas dataframe with all the data stored in the specified columns.
+    Yields:
+        pd.DataFrame: A pandas dataframe with up to chunk_size rows of the data stored in the specified columns.
     """
     file_ext = os.path.splitext(file)[-1]
     if file_ext=='.csv':
@@ -34,38 +57,120 @@ def read_file(
         sep='\t'
     else:
         raise NotImplementedError("The selected filetype isn't supported. Please specify a file with a .csv, .txt or .tsv extension.")
+    if isinstance(sample, str):
+        sample = [sample]
     with open(file) as filelines:
-        i = 0
-        pos = 0
-        for l in filelines:
-            i += 1
-            l = l.split(sep)
+        header = filelines.readline().rstrip('\r\n').split(sep)
+        try:
+            column_indices = [header.index(col) for col in column_names]
+            if sample:
+                sample_index = header.index(sample_column)
+        except ValueError:
+            raise ValueError('The list of specified column names cannot be extracted from the file.')
+        read_csv_kwargs = dict(
+            sep=sep,
+            header=None,
+            dtype=str,
+            na_filter=False,
+            quoting=quoting
+        )
+        if not sample:
             try:
-                raw = l.index(column_names[0])
-                prot = l.index(column_names[1])
-                seq = l.index(column_names[2])
-            except:
-                raise ValueError('The list of specified column names cannot be extracted from the file.')
-            if i>0:
-                break
+                for chunk in pd.read_csv(filelines, usecols=column_indices, chunksize=chunk_size, **read_csv_kwargs):
+                    chunk = chunk[column_indices]
+                    chunk.columns = column_names
+                    yield chunk
+            except pd.errors.EmptyDataError:
+                # the file contains only the header
+                return
+        else:
+            # a line can only belong to a selected sample if it contains one of the sample names,
+            # all other lines are skipped before they are split into columns
+            sample_reg = re.compile('|'.join([re.escape(each) for each in sample]))
+            usecols = sorted(set(column_indices + [sample_index]))
+            while True:
+                lines = list(islice(filelines, chunk_size))
+                if len(lines) == 0:
+                    break
+                lines = [l for l in lines if sample_reg.search(l)]
+                if len(lines) == 0:
+                    continue
+                chunk = pd.read_csv(StringIO(''.join(lines)), usecols=usecols, **read_csv_kwargs)
+                # the exact match removes lines that contain a sample name in any other column
+                chunk = chunk[chunk[sample_index].isin(sample)]
+                chunk = chunk[column_indices]
+                chunk.columns = column_names
+                yield chunk.reset_index(drop=True)
 
-    with open(file) as filelines:
-        raws = []
-        prots = []
-        seqs = []
-        for l in filelines:
-            l = l.split(sep)
-            raws.append(l[raw])
-            prots.append(l[prot])
-            seqs.append(l[seq])
 
-    res = pd.DataFrame({column_names[0]:raws[1:],
-             column_names[1]:prots[1:],
-             column_names[2]:seqs[1:]})
+def read_file(
+    file: str,
+    column_names: list
+) -> pd.DataFrame:
+    """Load a specified columns of the file as a pandas dataframe.
+
+    Args:
+        file (str): The name of a file.
+        column_names (list): The list of three columns that should be extracted from the file.
+
+    Raises:
+        NotImplementedError: if a specified file has not a .csv, .txt or .tsv extension.
+        ValueError: if any of the specified columns is not in the file.
+
+    Returns:
+        pd.DataFrame: A pandas dataframe with all the data stored in the specified columns.
+    """
+    chunks = list(read_file_chunks(file, column_names))
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=column_names)
+    res = pd.concat(chunks, ignore_index=True)
 
     return res
 
 
+def combine_chunks(
+    chunks: list,
+    column_names: list = ["all_protein_ids", "modified_sequence", "naked_sequence"]
+) -> pd.DataFrame:
+    """Combine the imported chunks of a file into a single pandas dataframe without missing values and duplicates.
+
+    Args:
+        chunks (list): The list of pandas dataframes imported from the individual chunks of a file.
+        column_names (list): The columns of the combined dataframe. Defaults to ["all_protein_ids", "modified_sequence", "naked_sequence"].
+
+    Returns:
+        pd.DataFrame: A pandas dataframe containing all unique rows of the chunks.
+    """
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=column_names)
+    input_data = pd.concat(chunks, ignore_index=True)[column_names]
+    input_data = input_data.dropna() # remove missing values
+    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    return input_data
+
+
+def apply_to_unique(
+    func,
+    *values
+) -> np.ndarray:
+    """Apply a function only once to every unique value (or unique combination of values) and broadcast the results
+    back to all rows.
+
+    Args:
+        func (function): The function that is called with one element of each of the values.
+        *values (Union[pd.Series, np.ndarray, list]): One or more sequences of equal length that are passed to the function.
+
+    Returns:
+        np.ndarray: An object array with the result of the function for every row.
+    """
+    data = pd.DataFrame({i: np.asarray(v, dtype=object) for i, v in enumerate(values)})
+    codes = data.groupby(list(data.columns), sort=False, dropna=False).ngroup().values
+    unique_values = data.drop_duplicates()
+    results = np.empty(unique_values.shape[0], dtype=object)
+    results[:] = [func(*args) for args in unique_values.itertuples(index=False, name=None)]
+    return results[codes]
+
+
 def extract_rawfile_unique_values(
     file: str
 ) -> list:
@@ -91,7 +196,7 @@ def extract_rawfile_unique_values(
     with open(file) as filelines:
         i = 0
         filename_col_index = None
-        filename_data = []
+        unique_filenames = set()
 
         for l in filelines:
             l = l.split(sep)
@@ -111,11 +216,10 @@ def extract_rawfile_unique_values(
                     else:
                         raise ValueError('A column with the raw file names is not in the file.')
             else:
-                filename_data.append(l[filename_col_index])
+                # the unique names are collected while streaming to not keep a value for every line in memory
+                unique_filenames.add(l[filename_col_index])
             i += 1
 
-        unique_filenames = set(filename_data)
-
     sorted_unique_filenames = sorted(list(unique_filenames))
     return sorted_unique_filenames
 
@@ -139,28 +243,23 @@ def import_spectronaut_data(
     """
     spectronaut_columns = ["PEP.AllOccurringProteinAccessions","EG.ModifiedSequence","R.FileName"]
 
-    data = read_file(file, spectronaut_columns)
-
-    if sample:
-        if isinstance(sample, list):
-            data_sub = data[data["R.FileName"].isin(sample)]
-            data_sub = data_sub[["PEP.AllOccurringProteinAccessions","EG.ModifiedSequence"]]
-        elif isinstance(sample, str):
-            data_sub = data[data["R.FileName"] == sample]
-            data_sub = data_sub[["PEP.AllOccurringProteinAccessions","EG.ModifiedSequence"]]
-    else:
-        data_sub = data[["PEP.AllOccurringProteinAccessions","EG.ModifiedSequence"]]
-
-    # get modified sequence
-    mod_seq = data_sub.apply(lambda row: re.sub('_','',row["EG.ModifiedSequence"]), axis=1)
-    data_sub = data_sub.assign(modified_sequence=mod_seq.values)
-    # get naked sequence
-    nak_seq = data_sub.apply(lambda row: re.sub(r'\[.*?\]','',row["modified_sequence"]), axis=1)
-    data_sub = data_sub.assign(naked_sequence=nak_seq.values)
-    data_sub = data_sub.rename(columns={"PEP.AllOccurringProteinAccessions": "all_protein_ids"})
-    input_data = data_sub[["all_protein_ids","modified_sequence","naked_sequence"]]
-    input_data = input_data.dropna()
-    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    data_chunks = []
+    for data in read_file_chunks(file, spectronaut_columns, sample=sample, sample_column="R.FileName"):
+        # every unique combination of protein ids and modified sequence is converted only once
+        data_sub = data[["PEP.AllOccurringProteinAccessions","EG.ModifiedSequence"]].drop_duplicates()
+        if data_sub.shape[0] == 0:
+            continue
+
+        # get modified sequence
+        mod_seq = apply_to_unique(lambda seq: re.sub('_','',seq), data_sub["EG.ModifiedSequence"])
+        data_sub = data_sub.assign(modified_sequence=mod_seq)
+        # get naked sequence
+        nak_seq = apply_to_unique(lambda seq: re.sub(r'\[.*?\]','',seq), data_sub["modified_sequence"])
+        data_sub = data_sub.assign(naked_sequence=nak_seq)
+        data_sub = data_sub.rename(columns={"PEP.AllOccurringProteinAccessions": "all_protein_ids"})
+        data_chunks.append(data_sub[["all_protein_ids","modified_sequence","naked_sequence"]].drop_duplicates())
+
+    input_data = combine_chunks(data_chunks)
     return input_data
 
 # Cell
@@ -183,96 +282,267 @@ def import_maxquant_data(
     """
     mq_columns = ["Proteins","Modified sequence","Raw file"]
 
-    data = read_file(file, mq_columns)
+    data_chunks = []
+    for data in read_file_chunks(file, mq_columns, sample=sample, sample_column="Raw file"):
+        # every unique combination of protein ids and modified sequence is converted only once
+        data_sub = data[["Proteins","Modified sequence"]].drop_duplicates()
+        if data_sub.shape[0] == 0:
+            continue
 
-    if sample:
-        if isinstance(sample, list):
-            data_sub = data[data["Raw file"].isin(sample)]
-            data_sub = data_sub[["Proteins","Modified sequence"]]
-        elif isinstance(sample, str):
-            data_sub = data[data["Raw file"] == sample]
-            data_sub = data_sub[["Proteins","Modified sequence"]]
-    else:
-        data_sub = data[["Proteins","Modified sequence"]]
+        # get modified sequence
+        mod_seq = apply_to_unique(lambda seq: re.sub('_','',seq), data_sub["Modified sequence"])
+        data_sub = data_sub.assign(modified_sequence=mod_seq)
 
-    # get modified sequence
-    mod_seq = data_sub.apply(lambda row: re.sub('_','',row["Modified sequence"]), axis=1)
-    data_sub = data_sub.assign(modified_sequence=mod_seq.values)
+        # replace outer () with []
+        mod_seq_replaced = apply_to_unique(lambda seq: re.sub(r'\((.*?\(.*?\))\)',r'[\1]',seq), data_sub["modified_sequence"])
+        data_sub = data_sub.assign(modified_sequence=mod_seq_replaced)
 
-    # replace outer () with []
-    mod_seq_replaced = data_sub.apply(lambda row: re.sub(r'\((.*?\(.*?\))\)',r'[\1]',row["modified_sequence"]), axis=1)
-    data_sub = data_sub.assign(modified_sequence=mod_seq_replaced.values)
+        # get naked sequence
+        nak_seq = apply_to_unique(lambda seq: re.sub(r'\[.*?\]','',seq), data_sub["modified_sequence"])
+        data_sub = data_sub.assign(naked_sequence=nak_seq)
+        data_sub = data_sub.rename(columns={"Proteins": "all_protein_ids"})
+        data_chunks.append(data_sub[["all_protein_ids","modified_sequence","naked_sequence"]].drop_duplicates())
 
-    # get naked sequence
-    nak_seq = data_sub.apply(lambda row: re.sub(r'\[.*?\]','',row["modified_sequence"]), axis=1)
-    data_sub = data_sub.assign(naked_sequence=nak_seq.values)
-    data_sub = data_sub.rename(columns={"Proteins": "all_protein_ids"})
-    input_data = data_sub[["all_protein_ids","modified_sequence","naked_sequence"]]
-    input_data = input_data.dropna() # remove missing values
-    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    input_data = combine_chunks(data_chunks)
     return input_data
 
+# Cell
+import numpy as np
+import pandas as pd
+from typing import Union
+
+# name, UniMod ID, monoisotopic mass delta, residues the modification is restricted to, residues reported as a group,
+# MaxQuant style label, AlphaPept abbreviation and marker symbol in the sequence plot
+modification_registry = pd.DataFrame.from_records(
+    columns=['name', 'unimod', 'mass', 'residues', 'residue_group', 'label', 'alphapept', 'ptm_shape'],
+    data=[
+        ('Acetyl', 1, 42.0106, '', '', '[Acetyl ({})]', 'a', 5),
+        ('Amidated', 2, -0.9840, '', '', '[Amidated ({})]', 'am', 22),
+        ('Carbamidomethyl', 4, 57.0215, '', '', '[Carbamidomethyl ({})]', '', 3),
+        ('Carbamyl', 5, 43.0058, '', '', '[Carbamyl ({})]', '', 16),
+        ('Deamidation', 7, 0.9840, '', 'NQ', '[Deamidation ({})]', 'deam', 14),
+        ('Phospho', 21, 79.9663, '', 'STY', '[Phospho ({})]', 'p', 0),
+        ('Dehydrated', 23, -18.0106, '', 'ST', '[Dehydrated ({})]', '', 23),
+        ('Pyro-carbamidomethyl', 26, 39.9949, '', '', '[Pyro-carbamidomethyl ({})]', '', 17),
+        ('Glu->pyro-Glu', 27, -18.0106, 'E', '', '[Glu->pyro-Glu]', 'pg', 11),
+        ('Gln->pyro-Glu', 28, -17.0265, 'Q', '', '[Gln->pyro-Glu]', 'pg', 12),
+        ('Cation:Na', 30, 21.9819, '', 'DE', '[Cation:Na ({})]', '', 21),
+        ('Methyl', 34, 14.0157, '', 'KR', '[Methyl ({})]', '', 6),
+        ('Oxidation', 35, 15.9949, '', '', '[Oxidation ({})]', 'ox', 4),
+        ('Dimethyl', 36, 28.0313, '', 'KR', '[Dimethyl ({})]', '', 6),
+        ('Trimethyl', 37, 42.0470, '', '', '[Trimethyl ({})]', '', 6),
+        ('Sulfo', 40, 79.9568, '', 'STY', '[Sulfo ({})]', '', 24),
+        ('Cys-Cys', 55, 305.0682, '', '', '[Cys-Cys]', 'c', 26),
+        ('GlyGly', 121, 114.0429, '', '', '[GlyGly ({})]', '', 2),
+        ('Delta:H(2)C(2)', 254, 26.0157, '', '', '[Delta:H(2)C(2) ({})]', '', 19),
+        ('Cysteinyl', 312, 119.0041, '', '', '[Cysteinyl]', '', 27),
+        ('Trioxidation', 345, 47.9847, '', '', '[Trioxidation ({})]', '', 4),
+        ('Hydroxyproline', 408, 148.0372, '', '', '[Hydroxyproline]', '', 15),
+        ('Dioxidation', 425, 31.9898, '', 'MW', '[Dioxidation ({})]', '', 4),
+        ('Dethiomethyl', 526, -48.0034, '', '', '[Dethiomethyl ({})]', '', 20),
+        ('QQTGG', 877, 599.2663, '', '', '[QQTGG ({})]', '', 13),
+        # MaxQuant modifications which are only used to select a shape in the sequence plot
+        ('Deamidation 18O', np.nan, np.nan, '', '', '[Deamidation 18O ({})]', '', 14),
+        ('Sulfation', np.nan, np.nan, '', '', '[Sulfation ({})]', '', 25),
+        ('Cysteinyl - carbamidomethyl', np.nan, np.nan, '', '', '[Cysteinyl - carbamidomethyl]', '', 28),
+        ('Pro5', np.nan, np.nan, '', '', '[Pro5]', '', 9),
+        ('Pro6', np.nan, np.nan, '', '', '[Pro6]', '', 10),
+    ]
+).set_index('name', drop=False)
+
+# lookup tables of the registry which are built once at import time
+modification_unimod_dict = {
+    '(UniMod:{})'.format(int(unimod)): name for name, unimod in modification_registry.unimod.dropna().items()
+}
+modification_alphapept_dict = modification_registry[modification_registry.alphapept != ''].groupby(
+    'alphapept', sort=False).name.apply(list).to_dict()
+modification_shape_dict = modification_registry.ptm_shape.to_dict()
+
+# the sorted mass index is searched by binary search
+_registered_masses = modification_registry.mass.dropna().sort_values(kind='mergesort')
+modification_mass_index = _registered_masses.values
+modification_mass_names = _registered_masses.index.values
+
+
+def _select_modification(
+    names: list,
+    site: str
+) -> Union[str, None]:
+    """Select the modification that is specific for the modified residue from the list of candidates. Modifications
+    without a residue restriction are preferred over modifications that are restricted to other residues, which are
+    never selected for a known residue. Without a residue, the first unrestricted candidate is selected.
+    """
+    residues = modification_registry.residues
+    if site:
+        specific = [name for name in names if residues[name] and site in residues[name]]
+        if specific:
+            return specific[0]
+    unspecific = [name for name in names if not residues[name]]
+    if unspecific:
+        return unspecific[0]
+    # all candidates are restricted to other residues
+    return None if site else names[0]
+
+
+def find_modification_by_mass(
+    mass: float,
+    site: str = '',
+    tolerance: float = 0.005
+) -> Union[str, None]:
+    """Find the registered modification with the closest mass delta within a tolerance.
+
+    Args:
+        mass (float): The mass delta of the modification in Da.
+        site (str): The modified residue, 'N-term' or 'C-term'. Used to choose between modifications with a similar mass. Defaults to ''.
+        tolerance (float): The maximum absolute difference between the masses in Da. Defaults to 0.005.
+
+    Returns:
+        Union[str, None]: The name of the modification or None if no modification for the site is registered within the tolerance.
+    """
+    left = np.searchsorted(modification_mass_index, mass - tolerance, side='left')
+    right = np.searchsorted(modification_mass_index, mass + tolerance, side='right')
+    if left == right:
+        return None
+    deltas = np.round(np.abs(modification_mass_index[left:right] - mass), 6)
+    closest = modification_mass_names[left:right][deltas == deltas.min()]
+    return _select_modification(list(closest), site)
+
+
+def find_modification_by_unimod(
+    unimod: str
+) -> Union[str, None]:
+    """Find the registered modification of a UniMod ID in the '(UniMod:21)' style.
+
+    Args:
+        unimod (str): The UniMod ID of the modification.
+
+    Returns:
+        Union[str, None]: The name of the modification or None if the UniMod ID is not registered.
+    """
+    return modification_unimod_dict.get(unimod)
+
+
+def find_modification_by_alphapept(
+    abbreviation: str,
+    site: str = ''
+) -> Union[str, None]:
+    """Find the registered modification of an AlphaPept abbreviation.
+
+    Args:
+        abbreviation (str): The AlphaPept abbreviation of the modification, e.g. 'ox'.
+        site (str): The modified residue. Used to choose between modifications with the same abbreviation. Defaults to ''.
+
+    Returns:
+        Union[str, None]: The name of the modification or None if the abbreviation is not registered for the site.
+    """
+    names = modification_alphapept_dict.get(abbreviation)
+    if names is None:
+        return None
+    return _select_modification(names, site)
+
+
+def format_modification(
+    name: str,
+    site: str
+) -> str:
+    """Format a registered modification in the MaxQuant style.
+
+    Args:
+        name (str): The name of the modification in the registry.
+        site (str): The modified residue, 'N-term' or 'C-term'. A residue is replaced by its group if the modification is reported for a group of residues.
+
+    Returns:
+        str: The modification in the MaxQuant style, e.g. '[Phospho (STY)]'.
+    """
+    residue_group = modification_registry.residue_group[name]
+    if site in residue_group:
+        site = residue_group
+    return modification_registry.label[name].format(site)
+
+
+def get_ptm_shape(
+    modification: str,
+    default: int = 17
+) -> int:
+    """Get the shape of a MaxQuant style modification in the sequence plot.
+
+    Args:
+        modification (str): The modification in the MaxQuant style, e.g. '[Phospho (STY)]'.
+        default (int): The shape of modifications that are not in the registry. Defaults to 17.
+
+    Returns:
+        int: The plotly marker symbol of the modification.
+    """
+    name = modification.strip('[]')
+    if name.endswith(')') and ' (' in name:
+        name = name.rsplit(' (', 1)[0]
+    return int(modification_shape_dict.get(name, default))
+
 # Cell
 import re
+import numpy as np
+import pandas as pd
+from typing import Union
+
+# residues which AlphaPept reports differently from the residue groups of the modification registry
+ap_modif_residue_dict = {
+    'ox': {'P': 'MP'}
+}
+
+# an AlphaPept modification is written in lowercase in front of the modified residue
+ap_modif_regex = re.compile('(?P<mod>[a-z0-9]+)(?P<aa>[A-Z]?)')
+
+def _convert_ap_modification(
+    posit
+) -> str:
+    """Convert a single AlphaPept style modification matched by ap_modif_regex into the MaxQuant style."""
+    mod, aa = posit.group('mod'), posit.group('aa')
+    if not aa:
+        # the modification is not followed by a residue
+        return posit.group()
+    mod_name = find_modification_by_alphapept(mod, aa)
+    if mod_name is None:
+        # an unknown modification or a modification on another residue, e.g. 'pg' on N, keeps its AlphaPept abbreviation
+        return aa + '[{} ({})]'.format(mod, aa)
+    if posit.start() == 0 and mod == 'a':
+        return format_modification(mod_name, 'N-term') + aa
+    if posit.end() == len(posit.string) and mod == 'am':
+        return aa + format_modification(mod_name, 'C-term')
+    add_aa = ap_modif_residue_dict.get(mod, {}).get(aa, aa)
+    return aa + format_modification(mod_name, add_aa)
 
 def convert_ap_mq_mod(
     sequence:str
 ) -> str:
     """Convert AlphaPept style modifications into MaxQuant style modifications.
 
+    The sequence is scanned only once and every modification is converted based on its own position.
+
     Args:
         sequence (str): The peptide sequence with modification in an AlphaPept style.
 
     Returns:
         str: The peptide sequence with modification in a similar to MaxQuant style.
     """
-    # TODO: add more AP modifications
-    modif_convers_dict = {
-        'ox': '[Oxidation ({})]',
-        'a': '[Acetyl ({})]',
-        'am': '[Amidated ({})]',
-        'deam': '[Deamidation ({})]',
-        'p': '[Phospho ({})]',
-        'pg': '[{}->pyro-Glu]',
-        'c': '[Cys-Cys]'
-    }
-    mods = re.findall('[a-z0-9]+', sequence)
-    if mods:
-        for mod in mods:
-            posit = re.search(mod, sequence)
-            i = posit.start()
-            if i == 0 and mod == 'a':
-                add_aa = 'N-term'
-            elif posit.end() == len(sequence) - 1 and mod == 'am':
-                add_aa = sequence[posit.end()]
-                sequence = sequence.replace(mod + add_aa, add_aa + mod, 1)
-                add_aa = 'C-term'
-            else:
-                add_aa = sequence[posit.end()]
-                sequence = sequence.replace(mod + add_aa, add_aa + mod, 1)
-
-            if mod == 'ox':
-                if add_aa == 'M':
-                    add_aa = 'M'
-                elif add_aa in 'MP':
-                    add_aa = 'MP'
-            elif mod == 'deam':
-                if add_aa in 'NQ':
-                    add_aa = 'NQ'
-            elif mod == 'p':
-                if add_aa in 'STY':
-                    add_aa = 'STY'
-            elif mod == 'pg':
-                if add_aa == 'E':
-                    add_aa = 'Glu'
-                elif add_aa == 'Q':
-                    add_aa = 'Gln'
-
-            if mod in modif_convers_dict.keys():
-                sequence = sequence.replace(mod, modif_convers_dict.get(mod).format(add_aa), 1)
-    return sequence
+    return ap_modif_regex.sub(_convert_ap_modification, sequence)
+
+def convert_ap_mq_mod_batch(
+    sequences: Union[pd.Series, np.ndarray, list]
+) -> np.ndarray:
+    """Convert AlphaPept style modifications of many peptides into MaxQuant style modifications.
+
+    Every unique sequence is converted only once.
+
+    Args:
+        sequences (Union[pd.Series, np.ndarray, list]): The peptide sequences with modifications in an AlphaPept style.
+
+    Returns:
+        np.ndarray: The peptide sequences with modifications in a similar to MaxQuant style.
+    """
+    return apply_to_unique(convert_ap_mq_mod, sequences)
 
 # Cell
+import csv
 import pandas as pd
 from typing import Union
 
@@ -291,122 +561,85 @@ def import_alphapept_data(
     """
     ap_columns = ["protein_group", "sequence", "shortname"]
 
-    data = pd.read_csv(file, usecols=ap_columns)
-    # TODO: add later the file reading using read_file function. For now it doesn't work for the protein groups that should be split later
-
-    if sample:
-        if isinstance(sample, list):
-            data_sub = data[data["shortname"].isin(sample)]
-            data_sub = data_sub[["protein_group", "sequence"]]
-        elif isinstance(sample, str):
-            data_sub = data[data["shortname"] == sample]
-            data_sub = data_sub[["protein_group", "sequence"]]
-    else:
-        data_sub = data[["protein_group", "sequence"]]
+    data_chunks = []
+    # the protein groups are quoted since they contain commas
+    for data in read_file_chunks(file, ap_columns, sample=sample, sample_column="shortname", quoting=csv.QUOTE_MINIMAL):
+        # every unique combination of protein group and sequence is converted only once
+        data_sub = data[["protein_group", "sequence"]].drop_duplicates()
+        data_sub = data_sub[~data_sub.sequence.str.contains('_decoy')]
+        if data_sub.shape[0] == 0:
+            continue
 
-    data_sub = data_sub[~data_sub.sequence.str.contains('_decoy')]
+        # get modified sequence
+        modif_seq = convert_ap_mq_mod_batch(data_sub.sequence)
+        data_sub['modified_sequence'] = modif_seq
 
-    # get modified sequence
-    modif_seq = data_sub.apply(lambda row: convert_ap_mq_mod(row.sequence), axis=1)
-    data_sub['modified_sequence'] = modif_seq.values
+        # get a list of proteins_id
+        proteins = apply_to_unique(lambda protein_group: ";".join([_.split('|')[1] for _ in protein_group.split(',')]), data_sub.protein_group)
+        data_sub['all_protein_ids'] = proteins
 
-    # get a list of proteins_id
-    proteins = data_sub.apply(lambda row: ";".join([_.split('|')[1] for _ in row.protein_group.split(',')]), axis=1)
-    data_sub['all_protein_ids'] = proteins.values
+        # get naked sequence
+        nak_seq = apply_to_unique(lambda seq: ''.join([_ for _ in seq if _.isupper()]), data_sub.sequence)
+        data_sub['naked_sequence'] = nak_seq
 
-    # get naked sequence
-    nak_seq = data_sub.apply(lambda row: ''.join([_ for _ in row.sequence if _.isupper()]), axis=1)
-    data_sub['naked_sequence'] = nak_seq.values
+        data_chunks.append(data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]].drop_duplicates())
 
-    input_data = data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]]
-    input_data = input_data.dropna() # remove missing values
-    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    input_data = combine_chunks(data_chunks)
     return input_data
 
 # Cell
 import re
+import numpy as np
+import pandas as pd
+from typing import Union
+
+# a DIA-NN modification is written behind the modified residue
+diann_modif_regex = re.compile(r'\(UniMod:\d+\)')
+
+def _convert_diann_modification(
+    posit
+) -> str:
+    """Convert a single DIA-NN style modification matched by diann_modif_regex into the MaxQuant style."""
+    mod_name = find_modification_by_unimod(posit.group())
+    if mod_name is None:
+        return posit.group()
+    if posit.start() == 0:
+        add_aa = 'N-term'
+    elif posit.end() == len(posit.string):
+        add_aa = 'C-term'
+    else:
+        add_aa = posit.string[posit.start()-1]
+    return format_modification(mod_name, add_aa)
 
 def convert_diann_mq_mod(
     sequence:str
 ) -> str:
     """Convert DIA-NN style modifications into MaxQuant style modifications.
 
+    The sequence is scanned only once and every modification is converted based on its own position.
+
     Args:
         sequence (str): The peptide sequence with modification in an AlphaPept style.
 
     Returns:
         str: The peptide sequence with modification in a similar to DIA-NN style.
     """
+    return diann_modif_regex.sub(_convert_diann_modification, sequence)
 
-    modif_convers_dict = {
-        '(UniMod:1)': '[Acetyl ({})]',
-        '(UniMod:2)': '[Amidated ({})]',
-        '(UniMod:4)': '[Carbamidomethyl ({})]',
-        '(UniMod:5)': '[Carbamyl ({})]',
-        '(UniMod:7)': '[Deamidation ({})]',
-        '(UniMod:21)': '[Phospho ({})]',
-        '(UniMod:23)': '[Dehydrated ({})]',
-        '(UniMod:26)': '[Pyro-carbamidomethyl ({})]',
-        '(UniMod:27)': '[Glu->pyro-Glu]',
-        '(UniMod:28)': '[Gln->pyro-Glu]',
-        '(UniMod:30)': '[Cation:Na ({})]',
-        '(UniMod:34)': '[Methyl ({})]',
-        '(UniMod:35)': '[Oxidation ({})]',
-        '(UniMod:36)': '[Dimethyl ({})]',
-        '(UniMod:37)': '[Trimethyl ({})]',
-        '(UniMod:40)': '[Sulfo ({})]',
-        '(UniMod:55)': '[Cys-Cys]',
-        '(UniMod:121)': '[GlyGly ({})]',
-        '(UniMod:254)': '[Delta:H(2)C(2) ({})]',
-        '(UniMod:312)': '[Cysteinyl]',
-        '(UniMod:345)': '[Trioxidation ({})]',
-        '(UniMod:408)': '[Hydroxyproline]',
-        '(UniMod:425)': '[Dioxidation ({})]',
-        '(UniMod:526)': '[Dethiomethyl ({})]',
-        '(UniMod:877)': '[QQTGG ({})]',
-    }
-    mods = re.findall('\(UniMod:\d+\)', sequence)
-    if mods:
-        for mod in mods:
-            posit = re.search('\(UniMod:\d+\)', sequence)
-            i = posit.start()
+def convert_diann_mq_mod_batch(
+    sequences: Union[pd.Series, np.ndarray, list]
+) -> np.ndarray:
+    """Convert DIA-NN style modifications of many peptides into MaxQuant style modifications.
 
-            if i == 0:
-                add_aa = 'N-term'
-            elif posit.end() == len(sequence):
-                add_aa = 'C-term'
-            else:
-                add_aa = sequence[i-1]
-
-            if mod == '(UniMod:7)':
-                if add_aa in 'NQ':
-                    add_aa = 'NQ'
-            elif mod == '(UniMod:21)':
-                if add_aa in 'STY':
-                    add_aa = 'STY'
-            elif mod == '(UniMod:23)':
-                if add_aa in 'ST':
-                    add_aa = 'ST'
-            elif mod == '(UniMod:30)':
-                if add_aa in 'DE':
-                    add_aa = 'DE'
-            elif mod == '(UniMod:34)':
-                if add_aa in 'KR':
-                    add_aa = 'KR'
-            elif mod == '(UniMod:36)':
-                if add_aa in 'KR':
-                    add_aa = 'KR'
-            elif mod == '(UniMod:40)':
-                if add_aa in 'STY':
-                    add_aa = 'STY'
-            elif mod == '(UniMod:425)':
-                if add_aa in 'MW':
-                    add_aa = 'MW'
-
-            if mod in modif_convers_dict.keys():
-                sequence = sequence.replace(mod, modif_convers_dict.get(mod).format(add_aa), 1)
-
-    return sequence
+    Every unique sequence is converted only once.
+
+    Args:
+        sequences (Union[pd.Series, np.ndarray, list]): The peptide sequences with modifications in a DIA-NN style.
+
+    Returns:
+        np.ndarray: The peptide sequences with modifications in a similar to MaxQuant style.
+    """
+    return apply_to_unique(convert_diann_mq_mod, sequences)
 
 # Cell
 import pandas as pd
@@ -427,32 +660,27 @@ def import_diann_data(
     """
     diann_columns = ["Protein.Ids", "Modified.Sequence", "Run"]
 
-    data = read_file(file, diann_columns)
+    data_chunks = []
+    for data in read_file_chunks(file, diann_columns, sample=sample, sample_column="Run"):
+        # every unique combination of protein ids and modified sequence is converted only once
+        data_sub = data[["Protein.Ids", "Modified.Sequence"]].drop_duplicates()
+        if data_sub.shape[0] == 0:
+            continue
 
-    if sample:
-        if isinstance(sample, list):
-            data_sub = data[data["Run"].isin(sample)]
-            data_sub = data_sub[["Protein.Ids", "Modified.Sequence"]]
-        elif isinstance(sample, str):
-            data_sub = data[data["Run"] == sample]
-            data_sub = data_sub[["Protein.Ids", "Modified.Sequence"]]
-    else:
-        data_sub = data[["Protein.Ids", "Modified.Sequence"]]
+        # get a list of proteins_id
+        data_sub = data_sub.rename(columns={"Protein.Ids": "all_protein_ids"})
 
-    # get a list of proteins_id
-    data_sub = data_sub.rename(columns={"Protein.Ids": "all_protein_ids"})
+        # get modified sequence
+        modif_seq = convert_diann_mq_mod_batch(data_sub["Modified.Sequence"])
+        data_sub['modified_sequence'] = modif_seq
 
-    # get modified sequence
-    modif_seq = data_sub.apply(lambda row: convert_diann_mq_mod(row["Modified.Sequence"]), axis=1)
-    data_sub['modified_sequence'] = modif_seq.values
+        # get naked sequence
+        nak_seq = apply_to_unique(lambda seq: re.sub(r'\[.*?\]', '', seq), data_sub["modified_sequence"])
+        data_sub = data_sub.assign(naked_sequence = nak_seq)
 
-    # get naked sequence
-    nak_seq = data_sub.apply(lambda row: re.sub(r'\[.*?\]', '', row["modified_sequence"]), axis=1)
-    data_sub = data_sub.assign(naked_sequence = nak_seq.values)
+        data_chunks.append(data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]].drop_duplicates())
 
-    input_data = data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]]
-    input_data = input_data.dropna() # remove missing values
-    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    input_data = combine_chunks(data_chunks)
     return input_data
 
 # Cell
@@ -464,6 +692,9 @@ def convert_fragpipe_mq_mod(
 ) -> str:
     """Convert FragPipe style modifications into MaxQuant style modifications.
 
+    The modifications are resolved by their mass delta from the modification registry. Masses that are not registered
+    are reported by their mass delta, e.g. '[+12.3456 (K)]'.
+
     Args:
         sequence (str): The peptide sequence with modification.
         assigned_modifications (str): The string of assigned modifications separated by comma.
@@ -471,33 +702,6 @@ def convert_fragpipe_mq_mod(
     Returns:
         str: The peptide sequence with modification in a similar to DIA-NN style.
     """
-    modif_convers_dict = {
-        42.0106: '[Acetyl ({})]',
-        -0.9840: '[Amidated ({})]',
-        57.0215: '[Carbamidomethyl ({})]',
-        43.0058: '[Carbamyl ({})]',
-        0.9840: '[Deamidation ({})]',
-        79.9663: '[Phospho ({})]',
-        -18.0106: ['[Dehydrated ({})]', '[Glu->pyro-Glu]'],
-        39.9949: '[Pyro-carbamidomethyl ({})]',
-        -17.0265: '[Gln->pyro-Glu]',
-        21.9819: '[Cation:Na ({})]',
-        14.0157: '[Methyl ({})]',
-        15.9949: '[Oxidation ({})]',
-        28.0313: '[Dimethyl ({})]',
-        42.047: '[Trimethyl ({})]',
-        79.9568: '[Sulfo ({})]',
-        305.0682: '[Cys-Cys]',
-        114.0429: '[GlyGly ({})]',
-        26.0157: '[Delta:H(2)C(2) ({})]',
-        119.0041: '[Cysteinyl]',
-        47.9847: '[Trioxidation ({})]',
-        148.0372: '[Hydroxyproline]',
-        31.9898: '[Dioxidation ({})]',
-        -48.0034: '[Dethiomethyl ({})]',
-        599.2663: '[QQTGG ({})]',
-    }
-
     if assigned_modifications:
         modifs_posit = [''] * (len(sequence) + 1)
         for mod in assigned_modifications.split(','):
@@ -507,42 +711,21 @@ def convert_fragpipe_mq_mod(
             if mod_pos == 'N-term':
                 posit = 0
                 add_aa = 'N-term'
+                site = sequence[:1]
             elif mod_pos == 'C-term':
                 posit = -1
                 add_aa = 'C-term'
+                site = sequence[-1:]
             else:
                 posit = int(mod_pos[:-1])
                 add_aa = mod_pos[-1]
-                if mod_mass == 0.9840:
-                    if add_aa in 'NQ':
-                        add_aa = 'NQ'
-                elif mod_mass == 79.9663:
-                    if add_aa in 'STY':
-                        add_aa = 'STY'
-                elif mod_mass == 21.9819:
-                    if add_aa in 'DE':
-                        add_aa = 'DE'
-                elif mod_mass == 14.0157:
-                    if add_aa in 'KR':
-                        add_aa = 'KR'
-                elif mod_mass == 28.0313:
-                    if add_aa in 'KR':
-                        add_aa = 'KR'
-                elif mod_mass == 79.9568:
-                    if add_aa in 'STY':
-                        add_aa = 'STY'
-                elif mod_mass == 31.9898:
-                    if add_aa in 'MW':
-                        add_aa = 'MW'
-            if mod_mass == -18.0106:
-                if add_aa == 'E':
-                    modifs_posit[posit] = modif_convers_dict[mod_mass][1].format(add_aa)
-                else:
-                    if add_aa in 'ST':
-                        add_aa = 'ST'
-                    modifs_posit[posit] = modif_convers_dict[mod_mass][0].format(add_aa)
+                site = add_aa
+            # a terminal modification is resolved against the terminal residue, e.g. Gln->pyro-Glu on an N-terminal Q
+            mod_name = find_modification_by_mass(mod_mass, site)
+            if mod_name is None:
+                modifs_posit[posit] = '[{:+.4f} ({})]'.format(mod_mass, add_aa)
             else:
-                modifs_posit[posit] = modif_convers_dict[mod_mass].format(add_aa)
+                modifs_posit[posit] = format_modification(mod_name, add_aa)
 
         modif_sequence = ''.join(["".join(i) for i in zip(' '+ sequence, modifs_posit)]).strip()
         return modif_sequence
@@ -574,51 +757,47 @@ def import_fragpipe_data(
         sep='\t'
     elif file_ext=='.txt':
         sep='\t'
+    data_chunks = []
     if sample:
-        if isinstance(sample, list):
-            column_names = [each + ' Spectral Count' for each in sample]
-            combined_fragpipe_columns = ["Sequence", "Protein ID"] + column_names
-            data = pd.read_csv(file, sep=sep, low_memory=False, usecols=combined_fragpipe_columns)
-            selected_indices = []
-            for column_name in column_names:
-                selected_indices.extend(data[data[column_name] > 0].index.tolist())
-            data_sub = data.iloc[list(set(selected_indices))]
-            data_sub = data_sub[["Sequence", "Protein ID"]]
-        elif isinstance(sample, str):
-            column_name = sample + ' Spectral Count'
-            combined_fragpipe_columns = ["Sequence", "Protein ID", column_name]
-            data = pd.read_csv(file, sep=sep, low_memory=False, usecols=combined_fragpipe_columns)
-            selected_indices = data[data[column_name] > 0].index.tolist()
-            data_sub = data.iloc[selected_indices]
+        if isinstance(sample, str):
+            sample = [sample]
+        column_names = [each + ' Spectral Count' for each in sample]
+        combined_fragpipe_columns = ["Sequence", "Protein ID"] + column_names
+        for data in pd.read_csv(file, sep=sep, low_memory=False, usecols=combined_fragpipe_columns, chunksize=1000000):
+            # select the peptides that were detected in any of the selected samples
+            data_sub = data[(data[column_names] > 0).any(axis=1)]
             data_sub = data_sub[["Sequence", "Protein ID"]]
 
-        # rename columns into all_proteins_id and naked sequence
-        data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Sequence": "naked_sequence"})
-        data_sub['modified_sequence'] = data_sub.naked_sequence
+            # rename columns into all_proteins_id and naked sequence
+            data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Sequence": "naked_sequence"})
+            data_sub['modified_sequence'] = data_sub.naked_sequence
+            data_chunks.append(data_sub.drop_duplicates())
 
     else:
         try:
             combined_fragpipe_columns = ["Sequence", "Protein ID"]
-            data_sub = pd.read_csv(file, sep=sep, low_memory=False, usecols=combined_fragpipe_columns)
+            for data_sub in pd.read_csv(file, sep=sep, low_memory=False, usecols=combined_fragpipe_columns, chunksize=1000000):
 
-            # rename columns into all_proteins_id and naked sequence
-            data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Sequence": "naked_sequence"})
-            data_sub['modified_sequence'] = data_sub.naked_sequence
+                # rename columns into all_proteins_id and naked sequence
+                data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Sequence": "naked_sequence"})
+                data_sub['modified_sequence'] = data_sub.naked_sequence
+                data_chunks.append(data_sub.drop_duplicates())
         except:
             fragpipe_columns = ["Protein ID", "Peptide", "Assigned Modifications"]
-            data = read_file(file, fragpipe_columns)
-            data_sub = data[["Protein ID", "Peptide", "Assigned Modifications"]]
+            data_chunks = []
+            for data in read_file_chunks(file, fragpipe_columns):
+                # every unique combination of protein ids and modified peptide is converted only once
+                data_sub = data[["Protein ID", "Peptide", "Assigned Modifications"]].drop_duplicates()
 
-            # get modified sequence
-            modif_seq = data_sub.apply(lambda row: convert_fragpipe_mq_mod(row["Peptide"], row["Assigned Modifications"]), axis=1)
-            data_sub['modified_sequence'] = modif_seq.values
+                # get modified sequence
+                modif_seq = apply_to_unique(convert_fragpipe_mq_mod, data_sub["Peptide"], data_sub["Assigned Modifications"])
+                data_sub['modified_sequence'] = modif_seq
 
-            # rename columns into all_proteins_id and naked sequence
-            data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Peptide": "naked_sequence"})
+                # rename columns into all_proteins_id and naked sequence
+                data_sub = data_sub.rename(columns={"Protein ID": "all_protein_ids", "Peptide": "naked_sequence"})
+                data_chunks.append(data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]].drop_duplicates())
 
-    input_data = data_sub[["all_protein_ids", "modified_sequence", "naked_sequence"]]
-    input_data = input_data.dropna() # remove missing values
-    input_data = input_data.drop_duplicates().reset_index(drop=True)
+    input_data = combine_chunks(data_chunks)
     return input_data
 
 # Cell
@@ -1,6 +1,10 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/organisms_data.ipynb (unless otherwise specified).
 
-__all__ = ['all_organisms', 'import_fasta', 'import_uniprot_annotation']
+__all__ = ['all_organisms', 'get_fasta_index_files', 'build_fasta_index', 'load_fasta_index', 'import_indexed_fasta',
+           'get_proteome', 'get_sequence', 'get_description', 'get_protein_table', 'fasta_index_version',
+           'import_fasta', 'get_uniprot_annotation_files', 'encode_uniprot_annotation', 'decode_uniprot_annotation',
+           'build_uniprot_annotation', 'load_uniprot_annotation', 'uniprot_annotation_version',
+           'uniprot_annotation_columns', 'import_uniprot_annotation']
 
 # Cell
 all_organisms = {
@@ -51,6 +55,210 @@ all_organisms = {
               }
 }
 
+# Cell
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+from pyteomics import fasta
+from pyteomics.auxiliary import OffsetIndex
+
+# the version of the sidecar format, a sidecar file with another version is rebuilt
+fasta_index_version = 2
+
+def get_fasta_index_files(fasta_file: str):
+    """
+    Get the names of the sidecar files of a fasta file.
+
+    Args:
+        fasta_file (str): Path to the fasta file.
+    Returns:
+        (str, str, str): The path to the index table, the path to the sequence buffer and the path to the file with the information about the indexed fasta file.
+    """
+    return (fasta_file + '.alphamap_index.npy',
+            fasta_file + '.alphamap_sequences.npy',
+            fasta_file + '.alphamap_index.json')
+
+def _get_fasta_file_info(fasta_file: str):
+    file_stat = os.stat(fasta_file)
+    return {'version': fasta_index_version,
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime_ns}
+
+def _to_fixed_width(values: list):
+    values = [value.encode('utf-8') for value in values]
+    return np.array(values, dtype='S{}'.format(max([len(v) for v in values], default=1)))
+
+def build_fasta_index(fasta_file: str):
+    """
+    Build the byte offset index and the compact proteome of a fasta file and store them in sidecar files.
+
+    Args:
+        fasta_file (str): Path to the fasta file.
+    Returns:
+        (np.ndarray, np.ndarray): Structured array with the header, UniProt accession, gene name, protein name, start and end byte offset, sequence offset and sequence length of each entry and the byte buffer with all sequences.
+    """
+    fasta_info = _get_fasta_file_info(fasta_file)
+    indexed_fasta = fasta.IndexedUniProt(fasta_file)
+    header_accessions = {header: accession for accession, header in indexed_fasta._id2header.items()}
+    header_sequences = {header: sequence for header, sequence in fasta.read(fasta_file)}
+
+    headers = list(indexed_fasta._offset_index.keys())
+    genes = []
+    names = []
+    for header in headers:
+        match = re.match(fasta.IndexedUniProt.header_pattern, header)
+        genes.append(match.group('GN') if match and match.group('GN') else '')
+        names.append(match.group('name') if match else '')
+    sequences = [header_sequences.get(header, '') for header in headers]
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+
+    columns = {
+        'header': _to_fixed_width(headers),
+        'accession': _to_fixed_width([header_accessions.get(header, '') for header in headers]),
+        'gene': _to_fixed_width(genes),
+        'name': _to_fixed_width(names),
+        'start': np.array([offsets[0] for offsets in indexed_fasta._offset_index.values()], dtype=np.int64),
+        'end': np.array([offsets[1] for offsets in indexed_fasta._offset_index.values()], dtype=np.int64),
+        'sequence_start': np.cumsum(lengths) - lengths,
+        'length': lengths}
+    table = np.zeros(len(headers), dtype=[(column, values.dtype) for column, values in columns.items()])
+    for column, values in columns.items():
+        table[column] = values
+    sequence_buffer = np.frombuffer(''.join(sequences).encode('ascii'), dtype=np.uint8)
+
+    table_file, sequence_file, info_file = get_fasta_index_files(fasta_file)
+    try:
+        # the files are renamed only after they are written completely, so an interrupted write never leaves a broken sidecar
+        for file, array in [(table_file, table), (sequence_file, sequence_buffer)]:
+            with open(file + '.tmp', 'wb') as f:
+                np.save(f, array)
+        with open(info_file + '.tmp', 'w') as f:
+            json.dump(fasta_info, f)
+        os.replace(table_file + '.tmp', table_file)
+        os.replace(sequence_file + '.tmp', sequence_file)
+        os.replace(info_file + '.tmp', info_file)
+    except OSError:
+        # the index is still used if the sidecar files can't be written, e.g. in a read-only folder
+        pass
+    return table, sequence_buffer
+
+def load_fasta_index(fasta_file: str):
+    """
+    Load the sidecar files of a fasta file as memory-mapped arrays. The sidecar files are built if they are missing or outdated.
+
+    Args:
+        fasta_file (str): Path to the fasta file.
+    Returns:
+        (np.ndarray, np.ndarray): Structured array with the header, UniProt accession, gene name, protein name, start and end byte offset, sequence offset and sequence length of each entry and the byte buffer with all sequences.
+    """
+    table_file, sequence_file, info_file = get_fasta_index_files(fasta_file)
+    try:
+        with open(info_file) as f:
+            stored_info = json.load(f)
+        if stored_info == _get_fasta_file_info(fasta_file):
+            return np.load(table_file, mmap_mode='r'), np.load(sequence_file, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    return build_fasta_index(fasta_file)
+
+def import_indexed_fasta(fasta_file: str):
+    """
+    Import a fasta file with the byte offset index from its sidecar file.
+
+    Args:
+        fasta_file (str): Path to the fasta file.
+    Returns:
+        fasta: Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+    """
+    table, _ = load_fasta_index(fasta_file)
+    headers = np.char.decode(table['header'], 'utf-8').tolist()
+    accessions = np.char.decode(table['accession'], 'utf-8').tolist()
+    indexed_fasta = fasta.IndexedUniProt(fasta_file, _skip_index=True)
+    indexed_fasta._offset_index = OffsetIndex(zip(headers, zip(table['start'].tolist(), table['end'].tolist())))
+    indexed_fasta._id2header = {accession: header for accession, header in zip(accessions, headers) if accession}
+    return indexed_fasta
+
+# the proteomes that were already loaded in this process, by fasta file
+_proteomes = {}
+
+def get_proteome(fasta: fasta):
+    """
+    Get the compact proteome of a fasta file. The proteome is loaded only once per process and fasta file.
+    The fasta file is checked for changes once per imported fasta object, so the lookups of sequences and descriptions don't access the file system.
+
+    Args:
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+    Returns:
+        dict: Dictionary with the memory-mapped 'table' and 'sequences' arrays of the proteome and the 'rows' dictionary mapping UniProt accessions and fasta headers to the rows of the table.
+    """
+    proteome = getattr(fasta, '_alphamap_proteome', None)
+    if proteome is None:
+        fasta_file = os.path.abspath(fasta._source.name)
+        fasta_info = _get_fasta_file_info(fasta_file)
+        if fasta_file not in _proteomes or _proteomes[fasta_file]['info'] != fasta_info:
+            table, sequences = load_fasta_index(fasta_file)
+            rows = {header: i for i, header in enumerate(np.char.decode(table['header'], 'utf-8').tolist())}
+            rows.update({accession: i for i, accession in enumerate(np.char.decode(table['accession'], 'utf-8').tolist()) if accession})
+            _proteomes[fasta_file] = {'info': fasta_info, 'table': table, 'sequences': sequences, 'rows': rows}
+        proteome = _proteomes[fasta_file]
+        fasta._alphamap_proteome = proteome
+    return proteome
+
+def get_sequence(fasta: fasta, protein: str):
+    """
+    Get the sequence of a protein from the compact proteome of a fasta file.
+
+    Args:
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        protein (str): UniProt accession or fasta header of the protein.
+    Raises:
+        KeyError: if the protein is not in the fasta file.
+    Returns:
+        str: The protein sequence.
+    """
+    proteome = get_proteome(fasta)
+    entry = proteome['table'][proteome['rows'][protein]]
+    start = entry['sequence_start']
+    return proteome['sequences'][start:start + entry['length']].tobytes().decode('ascii')
+
+def get_description(fasta: fasta, protein: str):
+    """
+    Get the UniProt accession, gene name and protein name of a protein from the compact proteome of a fasta file.
+
+    Args:
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        protein (str): UniProt accession or fasta header of the protein.
+    Raises:
+        KeyError: if the protein is not in the fasta file.
+    Returns:
+        dict: Dictionary with the 'id', 'name' and, if available, 'GN' of the protein, like the description of pyteomics 'fasta.IndexedUniProt'.
+    """
+    proteome = get_proteome(fasta)
+    entry = proteome['table'][proteome['rows'][protein]]
+    description = {'id': entry['accession'].decode('utf-8'),
+                   'name': entry['name'].decode('utf-8')}
+    if entry['gene']:
+        description['GN'] = entry['gene'].decode('utf-8')
+    return description
+
+def get_protein_table(fasta: fasta):
+    """
+    Get the UniProt accessions, gene names and sequence lengths of all proteins of a fasta file from its sidecar file.
+
+    Args:
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+    Returns:
+        pd.DataFrame: Dataframe with the columns 'protein_id', 'gene' and 'length'. Proteins without a gene name have 'None' as gene.
+    """
+    table = get_proteome(fasta)['table']
+    res = pd.DataFrame({'protein_id': np.char.decode(table['accession'], 'utf-8'),
+                        'gene': np.char.decode(table['gene'], 'utf-8'),
+                        'length': np.asarray(table['length'])})
+    res.loc[res.gene == '', 'gene'] = None
+    return res
+
 # Cell
 import os
 import urllib.request
@@ -60,7 +268,7 @@ from pyteomics import fasta
 def import_fasta(organism: str):
     """
     Import fasta file for the selected organism.
-    This downloads the file from github if not present.
+    This downloads the file from github if not present. The byte offset index is loaded from a sidecar file.
 
     Args:
         organism (str): Organism for which the fasta file should be imported.
@@ -89,10 +297,131 @@ def import_fasta(organism: str):
         with urllib.request.urlopen(github_file) as response, open(os.path.join(DATA_PATH, fasta_name), 'wb') as out_file:
             shutil.copyfileobj(response, out_file)
 
-    fasta_file = fasta.IndexedUniProt(os.path.join(DATA_PATH, fasta_name))
+    fasta_file = import_indexed_fasta(os.path.join(DATA_PATH, fasta_name))
 
     return fasta_file
 
+# Cell
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# the version of the binary annotation format, a binary annotation with another version is rebuilt
+uniprot_annotation_version = 1
+# the columns of a preprocessed uniprot annotation, they are stored as the int32 rows of a single array
+uniprot_annotation_columns = ['protein_id', 'feature', 'isoform_id', 'start', 'end', 'note']
+
+def get_uniprot_annotation_files(uniprot_file: str):
+    """
+    Get the names of the binary sidecar files of a preprocessed uniprot annotation csv file.
+
+    Args:
+        uniprot_file (str): Path to the csv file.
+    Returns:
+        (str, str): The path to the array with the encoded columns and the path to the file with the dictionaries of the string columns and the information about the csv file.
+    """
+    return (uniprot_file + '.alphamap_annotation.npy',
+            uniprot_file + '.alphamap_annotation.json')
+
+def _get_uniprot_file_info(uniprot_file: str):
+    file_stat = os.stat(uniprot_file)
+    return {'version': uniprot_annotation_version,
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime_ns}
+
+def encode_uniprot_annotation(uniprot_ann: pd.DataFrame):
+    """
+    Encode a uniprot annotation as int32 columns that are sorted by protein.
+    The string columns are dictionary-encoded with sorted dictionaries, missing values are encoded as -1.
+
+    Args:
+        uniprot_ann (pd.DataFrame): Uniprot annotation as returned by preprocess_uniprot.
+    Returns:
+        (np.ndarray, dict): Array with one int32 row per column and the dictionaries of the string columns.
+    """
+    columns = np.empty((len(uniprot_annotation_columns), len(uniprot_ann)), dtype=np.int32)
+    dictionaries = {}
+    for i, column in enumerate(uniprot_annotation_columns):
+        if column in ['start', 'end']:
+            columns[i] = uniprot_ann[column].fillna(-1).values
+        else:
+            codes, dictionary = pd.factorize(uniprot_ann[column].astype(object), sort=True)
+            columns[i] = codes
+            dictionaries[column] = [str(value) for value in dictionary]
+    # a stable sort keeps the order of the annotations within each protein
+    order = np.argsort(columns[0], kind='stable')
+    return columns[:, order], dictionaries
+
+def decode_uniprot_annotation(columns: np.ndarray, dictionaries: dict):
+    """
+    Decode a uniprot annotation from int32 columns.
+    The string columns are categorical, so their values are only decoded for the rows that are selected from the table.
+    start and end are int32 and a position column with missing values is float64.
+
+    Args:
+        columns (np.ndarray): Array with one int32 row per column as returned by encode_uniprot_annotation.
+        dictionaries (dict): Dictionaries of the string columns.
+    Returns:
+        pd.DataFrame: Uniprot annotation sorted by protein.
+    """
+    uniprot_ann = {}
+    for i, column in enumerate(uniprot_annotation_columns):
+        codes = columns[i]
+        if column in ['start', 'end']:
+            missing = codes < 0
+            uniprot_ann[column] = np.where(missing, np.nan, codes) if missing.any() else codes
+        else:
+            # the code -1 of the missing values is decoded as NaN
+            uniprot_ann[column] = pd.Categorical.from_codes(codes, dictionaries[column])
+    return pd.DataFrame(uniprot_ann)
+
+def build_uniprot_annotation(uniprot_file: str):
+    """
+    Encode a preprocessed uniprot annotation csv file and store it in binary sidecar files.
+
+    Args:
+        uniprot_file (str): Path to the csv file.
+    Returns:
+        (np.ndarray, dict): Array with one int32 row per column and the dictionaries of the string columns.
+    """
+    uniprot_info = _get_uniprot_file_info(uniprot_file)
+    columns, dictionaries = encode_uniprot_annotation(pd.read_csv(uniprot_file))
+    array_file, info_file = get_uniprot_annotation_files(uniprot_file)
+    try:
+        # the files are renamed only after they are written completely, so an interrupted write never leaves a broken sidecar
+        with open(array_file + '.tmp', 'wb') as f:
+            np.save(f, columns)
+        with open(info_file + '.tmp', 'w') as f:
+            json.dump(dict(uniprot_info, dictionaries=dictionaries), f)
+        os.replace(array_file + '.tmp', array_file)
+        os.replace(info_file + '.tmp', info_file)
+    except OSError:
+        # the annotation is still used if the sidecar files can't be written, e.g. in a read-only folder
+        pass
+    return columns, dictionaries
+
+def load_uniprot_annotation(uniprot_file: str):
+    """
+    Load a preprocessed uniprot annotation from its binary sidecar files, the int32 columns are memory-mapped.
+    The sidecar files are built from the csv file if they are missing or outdated.
+
+    Args:
+        uniprot_file (str): Path to the csv file.
+    Returns:
+        pd.DataFrame: Uniprot annotation sorted by protein, see decode_uniprot_annotation.
+    """
+    array_file, info_file = get_uniprot_annotation_files(uniprot_file)
+    try:
+        with open(info_file) as f:
+            stored_info = json.load(f)
+        dictionaries = stored_info.pop('dictionaries')
+        if stored_info == _get_uniprot_file_info(uniprot_file):
+            return decode_uniprot_annotation(np.load(array_file, mmap_mode='r'), dictionaries)
+    except (OSError, ValueError, KeyError):
+        pass
+    return decode_uniprot_annotation(*build_uniprot_annotation(uniprot_file))
+
 # Cell
 import os
 import urllib.request
@@ -102,12 +431,12 @@ import pandas as pd
 def import_uniprot_annotation(organism: str):
     """
     Import uniprot annotation file for the selected organism.
-    This downloads the file from github if not present.
+    This downloads the file from github if not present. The annotation is loaded from its binary sidecar files.
 
     Args:
         organism (str): Organism for which the uniprot annotation should be imported.
     Returns:
-        pd.DataFrame: Dataframe with the uniprot annotations for the selected organism.
+        pd.DataFrame: Dataframe with the uniprot annotations for the selected organism sorted by protein.
 
     """
     if not organism in all_organisms.keys():
@@ -132,6 +461,6 @@ def import_uniprot_annotation(organism: str):
         with urllib.request.urlopen(github_file) as response, open(os.path.join(DATA_PATH, uniprot_name), 'wb') as out_file:
             shutil.copyfileobj(response, out_file)
 
-    uniprot_file = pd.read_csv(os.path.join(DATA_PATH, uniprot_name))
+    uniprot_file = load_uniprot_annotation(os.path.join(DATA_PATH, uniprot_name))
 
     return uniprot_file
\ No newline at end of file
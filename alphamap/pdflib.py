@@ -3,13 +3,24 @@
 
 # This script has kindly been provided by Julia Schessner.
 
+import os
+import atexit
+import pickle
+import tempfile
+import multiprocessing
 from io import BytesIO
+from collections import deque
+from itertools import repeat, islice
+from concurrent.futures import ProcessPoolExecutor, wait
+import plotly.io as pio
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Paragraph
 
 
-from pdfrw import PdfReader, PdfDict
+from pdfrw import PdfReader, PdfDict, PdfArray, PdfName, PdfObject
+from pdfrw.pdfwriter import user_fmt
+from pdfrw.py23_diffs import convert_store
 from pdfrw.buildxobj import pagexobj
 from pdfrw.toreportlab import makerl
 from reportlab.platypus import Flowable
@@ -112,29 +123,178 @@ def draw_paragraph(text, pdf, cw, ch, poi, centered_vertically=False):
     poi[0] += w
     return poi
 
+class ExportedFigure():
+    """
+    ExportedFigure holds the image of a plotly figure that was exported by kaleido,
+    so the export can run in another process than the drawing of the pdf.
+    The figure can be a plotly figure or its dictionary, which is exported without validation.
+    """
+
+    def __init__(self, fig, rasterize=False, png_scaling=4):
+        layout = fig.get('layout', {}) if isinstance(fig, dict) else fig.layout
+        self.width = layout['width'] if 'width' in layout else None
+        self.height = layout['height'] if 'height' in layout else None
+        self.rasterize = rasterize
+        if rasterize:
+            self.image = pio.to_image(fig, format='png', scale=png_scaling, validate=False)
+        else:
+            self.image = pio.to_image(fig, format='pdf', validate=False)
+
+
+# The shared arguments of the current batch of figures of an export worker process.
+_export_worker_state = {'shared_file': None, 'shared_kwargs': {}}
+
+def _init_export_worker():
+    # kaleido is started by the first export, so this is done before the worker gets any figure
+    try:
+        pio.to_image({'data': [], 'layout': {}}, format='pdf', validate=False)
+    except Exception:
+        pass
+
+def _export_figure(fig, rasterize, png_scaling):
+    return ExportedFigure(fig, rasterize=rasterize, png_scaling=png_scaling)
+
+def _build_and_export_figure(build_figure, item, shared_file, rasterize, png_scaling):
+    if _export_worker_state['shared_file'] != shared_file:
+        with open(shared_file, 'rb') as f:
+            _export_worker_state['shared_kwargs'] = pickle.load(f)
+        _export_worker_state['shared_file'] = shared_file
+    fig = build_figure(item, **_export_worker_state['shared_kwargs'])
+    return ExportedFigure(fig, rasterize=rasterize, png_scaling=png_scaling)
+
+
+class FigureExportPool():
+    """
+    FigureExportPool keeps worker processes with a running kaleido alive between batches of figures,
+    so only the first batch pays for starting the processes and kaleido.
+    The workers are spawned, so they never share a kaleido process with the parent.
+    """
+
+    def __init__(self, n_processes=None):
+        self.n_processes = n_processes or os.cpu_count()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None or self._executor._broken:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_processes,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_export_worker)
+        return self._executor
+
+    def export(self, figures, rasterize=False, png_scaling=4):
+        """
+        Export a batch of plotly figures, the exported figures are returned in the order of the figures.
+        """
+        figures = [fig if isinstance(fig, dict) else fig.to_plotly_json() for fig in figures]
+        yield from self._get_executor().map(_export_figure, figures, repeat(rasterize), repeat(png_scaling))
+
+    def build_and_export(self, build_figure, items, shared_kwargs={}, rasterize=False, png_scaling=4):
+        """
+        Build the figures build_figure(item, **shared_kwargs) of a batch of items in the workers and export them.
+        The shared arguments are sent once per worker through a temporary file instead of once per item.
+        At most two items per worker are submitted ahead of the returned figures. If the batch is not consumed
+        completely, the queued items are cancelled and the running ones are finished before the file is removed.
+        """
+        fd, shared_file = tempfile.mkstemp(suffix='.pickle')
+        futures = deque()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(shared_kwargs, f)
+            executor = self._get_executor()
+            items = iter(items)
+            while True:
+                for item in islice(items, 2 * self.n_processes - len(futures)):
+                    futures.append(executor.submit(_build_and_export_figure, build_figure, item,
+                                                   shared_file, rasterize, png_scaling))
+                if not futures:
+                    break
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+            # the running items still read the shared file
+            wait(futures)
+            os.remove(shared_file)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+# Export pools by number of processes, they are shared by all reports of a process.
+_export_pools = {}
+
+def get_export_pool(n_processes=None):
+    n_processes = n_processes or os.cpu_count()
+    if n_processes not in _export_pools:
+        _export_pools[n_processes] = FigureExportPool(n_processes)
+    return _export_pools[n_processes]
+
+@atexit.register
+def _shutdown_export_pools():
+    for pool in _export_pools.values():
+        pool.shutdown()
+
+
+# Form XObjects and links of static content that is drawn on many pages, see draw_static_content.
+_static_xobjs = {}
+
+def draw_static_content(pdf, content, width=595, height=842, border=40, spacing=7):
+    """
+    Draw content that is the same on many pages, e.g. a footer or a logo, from a cached form XObject.
+    The content is laid out and rendered once per process, its links are added to every page.
+    """
+    key = (repr(content), width, height, border, spacing, pdf._fontname, pdf._fontsize)
+    if key not in _static_xobjs:
+        buf = BytesIO()
+        static_pdf = canvas.Canvas(buf, pagesize=(width, height))
+        static_pdf.setFont(pdf._fontname, pdf._fontsize)
+        links = []
+        # the links are recorded in page coordinates, because annotations can't be part of a form XObject
+        static_pdf.linkURL = lambda url, rect, relative=0, **kwargs: links.append(
+            (url, static_pdf._absRect(rect, relative), kwargs))
+        draw_content(static_pdf, content, width=width, height=height, border=border, spacing=spacing)
+        static_pdf.showPage()
+        static_pdf.save()
+        buf.seek(0)
+        _static_xobjs[key] = (pagexobj(PdfReader(buf).pages[0]), links)
+    xobj, links = _static_xobjs[key]
+    pdf.doForm(makerl(pdf, xobj))
+    for url, rect, kwargs in links:
+        pdf.linkURL(url, rect, relative=0, **kwargs)
+
+
 def draw_plotly(fig, pdf, cw, ch, poi, rescale=False, centerv=True, centerh=True,
                 rasterize = False, png_scaling=4):
-    w = fig.layout.width
-    if w is None:
-        w = cw
-        if rescale:
-            fig.update_layout(width=w)
-    h = fig.layout.height
-    if h is None:
-        h = ch
-        if rescale:
-            fig.update_layout(height=h)
+    if isinstance(fig, ExportedFigure):
+        exported = fig
+        w = exported.width if exported.width is not None else cw
+        h = exported.height if exported.height is not None else ch
+    else:
+        w = fig.layout.width
+        if w is None:
+            w = cw
+            if rescale:
+                fig.update_layout(width=w)
+        h = fig.layout.height
+        if h is None:
+            h = ch
+            if rescale:
+                fig.update_layout(height=h)
     if centerh:
         poi[0] += int((cw-w)/2)
     if centerv:
         poi[1] -= h+int((ch-h)/2)
     else:
         poi[1] -= h
-    if rasterize:
-        img = ImageReader(BytesIO(fig.to_image(format='png', scale=png_scaling)))
+    if not isinstance(fig, ExportedFigure):
+        exported = ExportedFigure(fig, rasterize=rasterize, png_scaling=png_scaling)
+    if exported.rasterize:
+        img = ImageReader(BytesIO(exported.image))
         pdf.drawImage(img, poi[0], poi[1], width=w, height=h)
     else:
-        img = PdfImage(BytesIO(fig.to_image(format='pdf')), width=w, height=h)
+        img = PdfImage(BytesIO(exported.image), width=w, height=h)
         img.drawOn(pdf, poi[0], poi[1])
     poi[0] += w
     return poi
@@ -154,7 +314,7 @@ def draw_content(pdf, content, width=595, height=842, border=40, spacing=7, png_
     fontsize = pdf._fontsize
     if type(content) == str:
         draw_paragraph(content, pdf, content_width, content_height, pointer, centered_vertically=True)
-    elif str(type(content)) == "<class 'plotly.graph_objs._figure.Figure'>":
+    elif str(type(content)) == "<class 'plotly.graph_objs._figure.Figure'>" or isinstance(content, ExportedFigure):
         draw_plotly(content, pdf, content_width, content_height, pointer, png_scaling=png_scaling)
     elif type(content) == bytes:
         draw_bytes(content, pdf, content_width, content_height, pointer)
@@ -171,7 +331,7 @@ def draw_content(pdf, content, width=595, height=842, border=40, spacing=7, png_
             # draw row
             if type(row) == str:
                 pointer = draw_paragraph(row, pdf, content_width, ch, pointer)
-            elif str(type(row)) == "<class 'plotly.graph_objs._figure.Figure'>":
+            elif str(type(row)) == "<class 'plotly.graph_objs._figure.Figure'>" or isinstance(row, ExportedFigure):
                 pointer = draw_plotly(row, pdf, content_width, ch, pointer,
                                       centerv=False, png_scaling=png_scaling)
             elif type(row) == bytes:
@@ -191,7 +351,7 @@ def draw_content(pdf, content, width=595, height=842, border=40, spacing=7, png_
                     # draw item
                     if type(i) == str:
                         pointer = draw_paragraph(i, pdf, cw, ch, pointer)
-                    elif str(type(i)) == "<class 'plotly.graph_objs._figure.Figure'>":
+                    elif str(type(i)) == "<class 'plotly.graph_objs._figure.Figure'>" or isinstance(i, ExportedFigure):
                         pointer = draw_plotly(i, pdf, cw, ch, pointer,
                                               centerv=False, centerh=False, png_scaling=png_scaling)
                     elif type(i) == bytes:
@@ -226,3 +386,77 @@ def draw_content(pdf, content, width=595, height=842, border=40, spacing=7, png_
     else:
         draw_paragraph("Unknown content of {} passed.".format(str(type(content))), pdf,
                        content_width, content_height, pointer, centered_vertically=True)
+
+
+class StreamingPdfWriter():
+    """
+    StreamingPdfWriter writes the pages of pdf files read by pdfrw to a new pdf file, one page after the other.
+    The objects of a page are written as soon as the page is added, so only the current page is kept in memory.
+    The catalog and the page tree are written when the writer is closed.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        # object 1 is the catalog and object 2 the page tree
+        self.n_objects = 2
+        self.page_refs = []
+        self.f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write_object(self, objnum, content):
+        self.offsets[objnum] = self.f.tell()
+        self.f.write(convert_store('%s 0 obj\n%s\nendobj\n' % (objnum, content)))
+
+    def add_page(self, page):
+        # attributes that are inherited from the page tree of the source file are set on the page itself
+        for key in ['Resources', 'MediaBox', 'CropBox', 'Rotate']:
+            value = page.inheritable[key]
+            if value is not None:
+                page[PdfName(key)] = value
+        page.Parent = PdfObject('2 0 R')
+        page.indirect = True
+
+        numbers = {}
+        deferred = []
+
+        def add(obj):
+            if isinstance(obj, PdfDict):
+                indirect = obj.indirect or (obj.stream is not None)
+            else:
+                indirect = getattr(obj, 'indirect', False)
+            if not indirect:
+                return format_obj(obj)
+            if id(obj) not in numbers:
+                self.n_objects += 1
+                numbers[id(obj)] = self.n_objects
+                deferred.append((self.n_objects, obj))
+            return '%s 0 R' % numbers[id(obj)]
+
+        def format_obj(obj):
+            if isinstance(obj, PdfDict):
+                pairs = sorted((getattr(key, 'encoded', None) or key, value) for key, value in obj.iteritems())
+                result = '<<%s>>' % ' '.join(['%s %s' % (key, add(value)) for key, value in pairs])
+                if obj.stream is not None:
+                    result = '%s\nstream\n%s\nendstream' % (result, obj.stream)
+                return result
+            if isinstance(obj, (PdfArray, list, tuple)):
+                return '[%s]' % ' '.join([add(value) for value in obj])
+            if hasattr(obj, 'indirect'):
+                return str(getattr(obj, 'encoded', None) or obj)
+            return user_fmt(obj)
+
+        page_ref = add(page)
+        while deferred:
+            objnum, obj = deferred.pop()
+            self._write_object(objnum, format_obj(obj))
+        self.page_refs.append(page_ref)
+
+    def close(self):
+        self._write_object(2, '<</Type /Pages /Count %s /Kids [%s]>>' % (len(self.page_refs), ' '.join(self.page_refs)))
+        self._write_object(1, '<</Type /Catalog /Pages 2 0 R>>')
+        xref_offset = self.f.tell()
+        n_objects = self.n_objects + 1
+        xref = ['xref\n0 %s\n' % n_objects, '0000000000 65535 f \n']
+        xref.extend(['%010d 00000 n \n' % self.offsets[i] for i in range(1, n_objects)])
+        xref.append('trailer\n<</Size %s /Root 1 0 R>>\nstartxref\n%s\n%%%%EOF\n' % (n_objects, xref_offset))
+        self.f.write(convert_store(''.join(xref)))
@@ -1,7 +1,9 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/Preprocessing.ipynb (unless otherwise specified).
 
-__all__ = ['extract_uniprot_id', 'expand_protein_ids', 'pep_position_helper', 'get_peptide_position', 'get_ptm_sites',
-           'get_modifications', 'format_input_data']
+__all__ = ['extract_uniprot_id', 'expand_protein_ids', 'get_protein_sequence', 'find_peptide_positions',
+           'pep_position_helper', 'get_peptide_position', 'get_ptm_sites', 'get_modifications', 'format_input_data',
+           'get_default_cache_dir', 'clear_cache', 'get_file_fingerprint', 'get_cache_key', 'import_formatted_data',
+           'cache_format_version', 'cache_max_size', 'get_protein_index', 'get_protein_data']
 
 # Cell
 import pandas as pd
@@ -32,6 +34,64 @@ def expand_protein_ids(df: pd.DataFrame):
     res.unique_protein_id = res.unique_protein_id.apply(lambda x: extract_uniprot_id(x))
     return res
 
+# Cell
+import warnings
+import numpy as np
+from pyteomics import fasta
+from .organisms_data import get_sequence
+
+def get_protein_sequence(prot: str, fasta: fasta):
+    """
+    Function to get the sequence of a protein from the compact proteome of a fasta file.
+
+    Args:
+        prot (str): UniProt protein accession.
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+    Returns:
+        str: The protein sequence or 'None' if the protein is not in the fasta file.
+
+    """
+    try:
+        return get_sequence(fasta, prot)
+    except KeyError:
+        return None
+
+def find_peptide_positions(peptides: list, proteins: list, fasta: fasta, verbose: bool = True):
+    """
+    Function to find all occurrences of peptides in their proteins.
+    Every unique combination of peptide and protein is searched only once and every protein sequence is taken only
+    once from the compact proteome.
+
+    Args:
+        peptides (list): Naked peptide sequences.
+        proteins (list): UniProt protein accessions of the peptides.
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        verbose (bool, optional): Flag to print warnings if no matching sequence is found for a protein in the provided fasta. Defaults to 'True'.
+    Returns:
+        dict: Dictionary with a list of all start positions for every pair of peptide and protein. The list is empty if the peptide is not found and 'None' if the protein is not in the fasta.
+
+    """
+    protein_sequences = {}
+    positions = {}
+    for seq, prot in dict.fromkeys(zip(peptides, proteins)):
+        if prot not in protein_sequences:
+            protein_sequences[prot] = get_protein_sequence(prot, fasta)
+        protein_sequence = protein_sequences[prot]
+        if protein_sequence is None:
+            positions[(seq, prot)] = None
+            if verbose:
+                warnings.warn(f'No matching entry for {prot} in the selected fasta.')
+            continue
+        starts = []
+        start = protein_sequence.find(seq)
+        while start != -1:
+            starts.append(start)
+            start = protein_sequence.find(seq, start + 1)
+        if len(starts) == 0 and verbose:
+            warnings.warn(f'Peptide sequence {seq} could not be mached to {prot} in the selected fasta.')
+        positions[(seq, prot)] = starts
+    return positions
+
 # Cell
 import re
 import numpy as np
@@ -39,7 +99,7 @@ from pyteomics import fasta
 
 def pep_position_helper(seq: str, prot: str, fasta: fasta, verbose: bool = True):
     """
-    Helper function for 'get_peptide_position'.
+    Helper function to get the first position of a single peptide in a protein.
 
     Args:
         seq (str): Naked peptide sequence.
@@ -50,27 +110,16 @@ def pep_position_helper(seq: str, prot: str, fasta: fasta, verbose: bool = True)
         [int, int]: int: peptide start position, int: peptide end position
 
     """
-    try:
-        fasta_prot = fasta[prot]
-        search_res = re.search(seq,fasta_prot.sequence)
-        if search_res is None:
-            start, end = np.NaN, np.NaN
-            if verbose:
-                warnings.warn(f'Peptide sequence {seq} could not be mached to {prot} in the selected fasta.')
-        else:
-            start, end = search_res.span()
-    except:
-        start, end = np.NaN, np.NaN
-        if verbose:
-            warnings.warn(f'No matching entry for {prot} in the selected fasta.')
-
-    return start, end-1
+    starts = find_peptide_positions([seq], [prot], fasta, verbose=verbose)[(seq, prot)]
+    if not starts:
+        return np.NaN, np.NaN
+    return starts[0], starts[0] + len(seq) - 1
 
 # Cell
 
 import warnings
 
-def get_peptide_position(df: pd.DataFrame, fasta: fasta, verbose:bool = True):
+def get_peptide_position(df: pd.DataFrame, fasta: fasta, verbose:bool = True, all_occurrences: bool = False):
     """
     Function to get start and end position of each peptide in the given protein.
 
@@ -78,19 +127,21 @@ def get_peptide_position(df: pd.DataFrame, fasta: fasta, verbose:bool = True):
         df (pd.DataFrame): Experimental data that was imported by the 'import_data' function and processed by 'expand_protein_ids'.
         fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
         verbose (bool, optional): Flag to print warnings if no matching sequence is found for a protein in the provided fasta. Defaults to 'True'.
+        all_occurrences (bool, optional): Flag to report every occurrence of a peptide in its protein in a separate row. Defaults to 'False'. In this case only the first occurrence is reported.
     Returns:
         pd.DataFrame: Dataframe with a new columns 'start' and 'end', indicating the start and end index position of the peptide sequence.
 
     """
     res = df.copy(deep=True)
-    res[['start','end']] = res.apply(lambda row: pep_position_helper(row['naked_sequence'],
-                                                                     row['unique_protein_id'],
-                                                                     fasta,
-                                                                     verbose=verbose),
-                                     axis=1, result_type='expand')
-
-    res_na = res[res.isnull().any(1)]
-    prots_na = res_na.unique_protein_id.unique()
+    positions = find_peptide_positions(res.naked_sequence, res.unique_protein_id, fasta, verbose=verbose)
+    starts = [positions[pair] for pair in zip(res.naked_sequence, res.unique_protein_id)]
+    if all_occurrences:
+        res['start'] = starts
+        res = res.explode('start')
+        res['start'] = res['start'].astype(float)
+    else:
+        res['start'] = [s[0] if s else np.NaN for s in starts]
+    res['end'] = res['start'] + res['naked_sequence'].str.len() - 1
 
     res = res.dropna()
     res['start'] = res['start'].astype('int64')
@@ -166,4 +217,247 @@ def format_input_data(df: pd.DataFrame, fasta: fasta, modification_exp: str, ver
     res = expand_protein_ids(res)
     res = get_peptide_position(res, fasta = fasta, verbose=verbose)
     res = get_modifications(res, mod_reg = modification_exp)
-    return res
\ No newline at end of file
+    return res
+
+# Cell
+import os
+import json
+import glob
+import hashlib
+from typing import Union
+from .importing import import_data
+
+# the version of the cache format, which is part of every cache key
+cache_format_version = 1
+# the maximum size of the cache folder in bytes, the least recently used entries are removed above this size
+cache_max_size = 2 * 1024**3
+
+def get_default_cache_dir():
+    """
+    Function to get the default cache folder of alphamap in the cache folder of the user.
+    This is '%LOCALAPPDATA%\\alphamap\\cache' on Windows and '$XDG_CACHE_HOME/alphamap' or '~/.cache/alphamap' otherwise.
+
+    Returns:
+        str: Path to the cache folder.
+
+    """
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'alphamap', 'cache')
+    base_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base_dir, 'alphamap')
+
+def _limit_cache_size(cache_dir: str, max_size: int, keep: str):
+    """
+    Function to remove the least recently used entries from the cache folder until its size is at most max_size bytes.
+    The entry with the key 'keep' is never removed.
+    """
+    entries = []
+    for cache_file in glob.glob(os.path.join(cache_dir, '*.parquet')):
+        try:
+            entries.append((os.path.getmtime(cache_file), os.path.getsize(cache_file), cache_file))
+        except OSError:
+            # the entry was removed by another process
+            continue
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, cache_file in sorted(entries):
+        if total_size <= max_size:
+            break
+        if os.path.basename(cache_file) == keep + '.parquet':
+            continue
+        for file in [cache_file, cache_file[:-len('.parquet')] + '.json']:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+        total_size -= size
+
+def clear_cache(cache_dir: Union[str, None] = None):
+    """
+    Function to remove all formatted data from the cache folder of the 'import_formatted_data' function.
+
+    Args:
+        cache_dir (Union[str, None], optional): Folder of the cache. Defaults to 'None'. In this case the default cache folder of the user is used.
+    Returns:
+        int: The number of removed cache entries.
+
+    """
+    if cache_dir is None:
+        cache_dir = get_default_cache_dir()
+    n_entries = 0
+    for pattern in ['*.parquet', '*.json', '*.tmp']:
+        for file in glob.glob(os.path.join(cache_dir, pattern)):
+            try:
+                os.remove(file)
+            except OSError:
+                continue
+            if file.endswith('.parquet'):
+                n_entries += 1
+    return n_entries
+
+def get_file_fingerprint(file: str, block_size: int = 1048576, n_blocks: int = 16):
+    """
+    Function to get a fingerprint of a file from its size, modification time and content hash.
+    The content hash of files that are larger than n_blocks * block_size is calculated from n_blocks evenly spaced blocks,
+    so the fingerprint of a file with many GB is calculated in a fraction of a second.
+    Such a fingerprint doesn't detect an edit of a large file outside of the hashed blocks that keeps the size and the
+    modification time of the file, e.g. an in-place edit whose modification time was restored afterwards.
+    The cached data of such a file is only imported again after it is removed with 'clear_cache'.
+
+    Args:
+        file (str): Path to the file.
+        block_size (int, optional): Number of bytes in a block that is hashed. Defaults to 1048576.
+        n_blocks (int, optional): Number of blocks that are hashed for large files. Defaults to 16.
+    Returns:
+        dict: Dictionary with the size, modification time and content hash of the file.
+
+    """
+    file_stat = os.stat(file)
+    content_hash = hashlib.sha1()
+    with open(file, 'rb') as f:
+        if file_stat.st_size <= block_size * n_blocks:
+            content_hash.update(f.read())
+        else:
+            step = (file_stat.st_size - block_size) // (n_blocks - 1)
+            for i in range(n_blocks):
+                f.seek(i * step)
+                content_hash.update(f.read(block_size))
+    return {'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime_ns,
+            'hash': content_hash.hexdigest()}
+
+def get_cache_key(file: str, fasta: fasta, modification_exp: str, sample: Union[str, list, None] = None):
+    """
+    Function to get the key of the cached formatted data of an input file.
+
+    Args:
+        file (str): Path to the experimental data file.
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        modification_exp (str): Regular expression for the modifications.
+        sample (Union[str, list, None], optional): The unique raw file name(s) to filter the data. Defaults to 'None'.
+    Returns:
+        (str, dict): The key of the cache and a dictionary with all information that was used to build the key.
+
+    """
+    fasta_file = fasta._source.name
+    if isinstance(sample, str):
+        sample = [sample]
+    key_info = {'version': cache_format_version,
+                'file': os.path.abspath(file),
+                'file_fingerprint': get_file_fingerprint(file),
+                'fasta': os.path.abspath(fasta_file),
+                'fasta_fingerprint': get_file_fingerprint(fasta_file),
+                'sample': sorted(sample) if sample else None,
+                'modification_exp': modification_exp}
+    key = hashlib.sha1(json.dumps(key_info, sort_keys=True).encode()).hexdigest()
+    return key, key_info
+
+def import_formatted_data(file: str, fasta: fasta, modification_exp: str = r'\[.*?\]',
+                          sample: Union[str, list, None] = None, cache_dir: Union[str, None] = None,
+                          max_cache_size: int = cache_max_size, verbose: bool = True):
+    """
+    Function to import and format experimental data with a persistent cache.
+    The formatted data is stored as a parquet file in the cache folder and is loaded from there if the input file,
+    the fasta file, the sample selection and the modification regular expression did not change.
+    If the cache folder grows above max_cache_size, the least recently used entries are removed. Use 'clear_cache' to remove all entries.
+
+    Args:
+        file (str): Path to the experimental data file.
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        modification_exp (str, optional): Regular expression for the modifications. Defaults to r'\[.*?\]'.
+        sample (Union[str, list, None], optional): The unique raw file name(s) to filter the data. Defaults to 'None'.
+        cache_dir (Union[str, None], optional): Folder of the cache. Defaults to 'None'. In this case the folder from 'get_default_cache_dir' is used.
+        max_cache_size (int, optional): The maximum size of the cache folder in bytes. Defaults to 'cache_max_size' (2 GB).
+        verbose (bool, optional): Flag to print warnings during the import and formatting. Defaults to 'True'.
+    Returns:
+        pd.DataFrame: Dataframe with unique uniprot accessions, sequence start and end positions, and PTM site information.
+
+    """
+    if cache_dir is None:
+        cache_dir = get_default_cache_dir()
+
+    key, key_info = get_cache_key(file, fasta, modification_exp, sample)
+    cache_file = os.path.join(cache_dir, key + '.parquet')
+
+    if os.path.exists(cache_file):
+        res = pd.read_parquet(cache_file)
+        try:
+            # the modification time marks the last use of the entry for the removal of the least recently used entries
+            os.utime(cache_file)
+        except OSError:
+            pass
+        # lists are stored as arrays in the parquet file
+        res['PTMsites'] = res.PTMsites.apply(lambda x: x.tolist())
+        res['PTMtypes'] = res.PTMtypes.apply(lambda x: x.tolist())
+        return res
+
+    res = format_input_data(
+        df = import_data(file, verbose=verbose, sample=sample),
+        fasta = fasta,
+        modification_exp = modification_exp,
+        verbose = verbose)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # the files are renamed only after they are written completely, so an interrupted write never leaves a broken cache
+        res.to_parquet(cache_file + '.tmp')
+        with open(os.path.join(cache_dir, key + '.json.tmp'), 'w') as f:
+            json.dump(key_info, f, indent=1)
+        os.replace(os.path.join(cache_dir, key + '.json.tmp'), os.path.join(cache_dir, key + '.json'))
+        os.replace(cache_file + '.tmp', cache_file)
+        _limit_cache_size(cache_dir, max_cache_size, keep=key)
+    except OSError as e:
+        if verbose:
+            warnings.warn(f'The formatted data could not be stored in the cache folder {cache_dir}: {e}')
+    return res
+
+# Cell
+import weakref
+
+# Cache of the per-protein indices of the formatted datasets, see get_protein_index.
+_protein_indices = {}
+
+def get_protein_index(df: pd.DataFrame):
+    """
+    Function to get the per-protein index of a formatted dataset.
+    The rows are sorted by unique_protein_id with a stable sort, so the rows of each protein keep their order in df.
+    The index is built once per dataset and it is removed from the cache when the dataset is garbage collected.
+    The cached index is validated against the values array of the unique_protein_id column, so it is rebuilt if the rows
+    of df are sorted, filtered or the column is replaced in place. Values that are written into the existing column array
+    are not detected, so the protein ids of a dataset must not be edited element-wise after the index is built.
+
+    Args:
+        df (pd.DataFrame): Experimental data formatted by the 'format_input_data' function.
+    Returns:
+        (np.ndarray, dict): The row positions of df sorted by protein and a dict with the (start, end) offsets of each protein in these row positions.
+
+    """
+    key = id(df)
+    protein_ids = df.unique_protein_id.values
+    if key in _protein_indices and _protein_indices[key][0] is protein_ids:
+        return _protein_indices[key][1:]
+    codes, proteins = pd.factorize(protein_ids)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(proteins))
+    # rows without a protein id have the code -1 and are sorted in front of all proteins
+    ends = np.cumsum(counts) + np.sum(codes < 0)
+    starts = ends - counts
+    offsets = dict(zip(proteins, zip(starts, ends)))
+    if key not in _protein_indices:
+        weakref.finalize(df, _protein_indices.pop, key, None)
+    _protein_indices[key] = (protein_ids, order, offsets)
+    return order, offsets
+
+def get_protein_data(df: pd.DataFrame, protein: str):
+    """
+    Function to get the formatted data of a single protein from the cached per-protein index of a dataset.
+
+    Args:
+        df (pd.DataFrame): Experimental data formatted by the 'format_input_data' function.
+        protein (str): Uniprot protein accession.
+    Returns:
+        pd.DataFrame: The rows of df for the protein in their original order, empty if the protein is not in df.
+
+    """
+    order, offsets = get_protein_index(df)
+    start, end = offsets.get(protein, (0, 0))
+    return df.iloc[order[start:end]]
\ No newline at end of file
@@ -46,6 +46,28 @@ protease_dict["custom_enzyme"] = "[]"
 
 # Cell
 import re
+from functools import lru_cache
+
+@lru_cache(maxsize=4096)
+def _find_cleavage_sites(sequence: str, pattern: str):
+    """
+    Function to find the cleavage sites of a protease pattern in a sequence.
+    The sites are cached per sequence and pattern, so redrawing a protein is instant and
+    a changed custom enzyme pattern is never served from the cache.
+
+    Args:
+        sequence (str): Amino acid sequence.
+        pattern (str): Regular expression of the protease cleavage rule.
+    Returns:
+        tuple: Cleavage site indices for the pattern, empty if the pattern is invalid.
+
+    """
+    try:
+        compiled_pattern = re.compile(pattern)
+    except re.error:
+        return ()
+    return tuple(m.start(0) for m in compiled_pattern.finditer(sequence))
+
 def get_cleavage_sites(sequence: str, protease: str):
     """
     Function to get the position of proteolytic cleavage sites in a sequence.
@@ -57,10 +79,6 @@ def get_cleavage_sites(sequence: str, protease: str):
         list: List of cleavage site indices for the selected protease.
 
     """
-    try:
-        pattern = re.compile(protease_dict[protease])
-    except:
+    if protease not in protease_dict:
         return []
-    pattern_idx = pattern.finditer(sequence)
-    pattern_idx = [m.start(0) for m in pattern_idx]
-    return pattern_idx
\ No newline at end of file
+    return list(_find_cleavage_sites(sequence, protease_dict[protease]))
\ No newline at end of file
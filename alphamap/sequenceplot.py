@@ -1,7 +1,12 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/SequencePlot.ipynb (unless otherwise specified).
 
-__all__ = ['format_uniprot_annotation', 'ptm_shape_dict', 'get_plot_data', 'plot_single_peptide_traces',
-           'custom_color_palettes', 'uniprot_color_dict', 'aa_color_dict', 'plot_peptide_traces', 'create_pdf_report']
+__all__ = ['format_uniprot_annotation', 'get_uniprot_index', 'get_protein_annotation', 'ptm_shape_dict',
+           'get_plot_data', 'LRUCache', 'get_cached_plot_data', 'plot_data_cache', 'get_scatter_trace',
+           'get_sequence_tick_levels', 'get_sequence_ticks', 'update_sequence_axis', 'link_sequence_axis',
+           'plot_single_peptide_traces', 'webgl_point_threshold', 'max_sequence_ticks', 'sequence_tick_levels_cache',
+           'custom_color_palettes', 'uniprot_color_dict', 'aa_color_dict', 'get_feature_track_segments',
+           'plot_peptide_traces', 'export_report_figures', 'get_report_key', 'stream_pdf_report', 'remove_old_reports',
+           'create_pdf_report', 'report_footer_text']
 
 # Cell
 import pandas as pd
@@ -18,6 +23,12 @@ def format_uniprot_annotation(uniprot_ann: pd.DataFrame, uniprot_feature_dict: d
 
     """
     uniprot = uniprot_ann.copy(deep=True)
+    # the string columns of a binary annotation are categorical, the new values are added to their categories
+    add_categories = lambda column, values: column.cat.add_categories([v for v in values if v not in column.cat.categories])
+    if isinstance(uniprot.feature.dtype, pd.CategoricalDtype):
+        uniprot['feature'] = add_categories(uniprot.feature, ["STRUCTURE"])
+    if isinstance(uniprot.note.dtype, pd.CategoricalDtype):
+        uniprot['note'] = add_categories(uniprot.note, ["Helix", "Beta strand", "Turn"])
     uniprot.loc[uniprot.feature == "HELIX", "note"] = "Helix"
     uniprot.loc[uniprot.feature == "STRAND", "note"] = "Beta strand"
     uniprot.loc[uniprot.feature == "TURN", "note"] = "Turn"
@@ -26,54 +37,92 @@ def format_uniprot_annotation(uniprot_ann: pd.DataFrame, uniprot_feature_dict: d
     uniprot_feature_dict_rev = {v: k for k, v in uniprot_feature_dict.items()}
 
     uniprot['annotation'] = uniprot['note']
-    uniprot.loc[uniprot['annotation'].isnull(), 'annotation'] = uniprot['feature']
+    missing = uniprot['annotation'].isnull()
+    if isinstance(uniprot.annotation.dtype, pd.CategoricalDtype):
+        uniprot['annotation'] = add_categories(uniprot.annotation, uniprot.feature[missing].unique())
+    uniprot.loc[missing, 'annotation'] = uniprot.feature[missing].astype(object)
     uniprot = uniprot.replace({"annotation": uniprot_feature_dict_rev})
     return uniprot
 
-# Cell
+# Cache of the per-protein indices of the uniprot annotation tables, see get_uniprot_index.
+_uniprot_indices = {}
 
-# The PTM shape dictionary defines the shapes for each modification, so they are consistent across datasets and analyses.
-
-ptm_shape_dict = {
-    '[Acetyl (K)]': 5,
-    '[Acetyl (Protein N-term)]': 5,
-    '[Carbamidomethyl (C)]': 3,
-    '[Oxidation (M)]': 4,
-    '[Phospho (STY)]': 0,
-    '[GlyGly (K)]': 2,
-    '[Methyl (KR)]': 6,
-    '[Dimethyl (KR)]': 6,
-    '[Trimethyl (K)]': 6,
-    '[Pro5]': 9,
-    '[Pro6]': 10,
-    '[Glu->pyro-Glu]': 11,
-    '[Gln->pyro-Glu]': 12,
-    '[QQTGG (K)]': 13,
-    '[Deamidation (N)]': 14,
-    '[Deamidation 18O (N)]': 14,
-    '[Deamidation (NQ)]': 14,
-    '[Hydroxyproline]': 15,
-    '[Carbamyl (N-term)]': 16,
-    '[Delta:H(2)C(2) (N-term)]': 19,
-    '[Dioxidation (MW)]': 4,
-    '[Trioxidation (C)]': 4,
-    '[Dethiomethyl (M)]': 20,
-    '[Cation:Na (DE)]': 21,
-    '[Methyl (E)]': 6,
-    '[Dehydrated (ST)]': 23,
-    '[Oxidation (P)]': 4,
-    '[Dimethyl (K)]': 6,
-    '[Amidated (Protein C-term)]': 22,
-    '[Sulfo (STY)]': 24,
-    '[Acetyl (N-term)]': 5,
-    '[Amidated (C-term)]': 22,
-    '[Sulfation (Y)]': 25,
-    '[Phospho (ST)]': 0,
-    '[Cys-Cys]': 26,
-    '[Cysteinyl]': 27,
-    '[Cysteinyl - carbamidomethyl]': 28,
-    '[Oxidation (MP)]': 4
-}
+def get_uniprot_index(uniprot_ann: pd.DataFrame, uniprot_feature_dict: dict):
+    """
+    Function to get the formatted uniprot annotation sorted by protein together with the row offsets of each protein.
+    The annotation is formatted and sorted once per annotation table and the index is cached for the last two tables.
+
+    Args:
+        uniprot_ann (pd.DataFrame): Formatted uniprot annotations from alphamap.
+        uniprot_feature_dict (dict): Uniprot feature dictionary defined by alphamap.
+    Returns:
+        (pd.DataFrame, dict): Formatted uniprot annotation sorted by protein_id and a dict with the (start, end) row offsets of each protein.
+
+    """
+    key = (id(uniprot_ann), uniprot_ann.shape[0], tuple(uniprot_feature_dict.items()))
+    if key in _uniprot_indices and _uniprot_indices[key][0] is uniprot_ann:
+        return _uniprot_indices[key][1:]
+    uniprot = format_uniprot_annotation(uniprot_ann, uniprot_feature_dict)
+    # a stable sort keeps the order of the annotations within each protein
+    uniprot = uniprot.sort_values('protein_id', kind='mergesort').reset_index(drop=True)
+    protein_ids = uniprot.protein_id.values
+    is_start = np.ones(len(protein_ids), dtype=bool)
+    is_start[1:] = protein_ids[1:] != protein_ids[:-1]
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(protein_ids))
+    offsets = {protein_ids[start]: (start, end) for start, end in zip(starts, ends)}
+    while len(_uniprot_indices) >= 2:
+        _uniprot_indices.pop(next(iter(_uniprot_indices)))
+    # the annotation table itself is kept in the cache, so its id can't be reused by another table
+    _uniprot_indices[key] = (uniprot_ann, uniprot, offsets)
+    return uniprot, offsets
+
+def get_protein_annotation(uniprot_ann: pd.DataFrame, protein: str, uniprot_feature_dict: dict):
+    """
+    Function to get the formatted uniprot annotation of a single protein from the cached per-protein index.
+
+    Args:
+        uniprot_ann (pd.DataFrame): Formatted uniprot annotations from alphamap.
+        protein (str): Uniprot protein accession.
+        uniprot_feature_dict (dict): Uniprot feature dictionary defined by alphamap.
+    Returns:
+        pd.DataFrame: Formatted uniprot annotation of the protein, empty if the protein is not annotated.
+
+    """
+    uniprot, offsets = get_uniprot_index(uniprot_ann, uniprot_feature_dict)
+    start, end = offsets.get(protein, (0, 0))
+    protein_annotation = uniprot.iloc[start:end].copy()
+    # the notes of a binary annotation are only decoded for the rows of the protein
+    for column in ['isoform_id', 'note', 'annotation']:
+        if isinstance(protein_annotation[column].dtype, pd.CategoricalDtype):
+            protein_annotation[column] = protein_annotation[column].astype(object)
+    return protein_annotation
+
+# Cell
+# The shape of each modification is taken from the modification registry, so the shapes are consistent across
+# datasets and analyses.
+from .importing import get_ptm_shape
+
+class _PTMShapeDict(dict):
+    # modifications which are not listed are resolved from the modification registry
+    def __missing__(self, modification):
+        return get_ptm_shape(modification)
+
+# The shapes of the MaxQuant style modifications from the modification registry, kept for code that used the former
+# hard-coded dictionary of this module. New code should call importing.get_ptm_shape.
+ptm_shape_dict = _PTMShapeDict({modification: get_ptm_shape(modification) for modification in [
+    '[Acetyl (K)]', '[Acetyl (Protein N-term)]', '[Carbamidomethyl (C)]', '[Oxidation (M)]', '[Phospho (STY)]',
+    '[GlyGly (K)]', '[Methyl (KR)]', '[Dimethyl (KR)]', '[Trimethyl (K)]', '[Pro5]', '[Pro6]', '[Glu->pyro-Glu]',
+    '[Gln->pyro-Glu]', '[QQTGG (K)]', '[Deamidation (N)]', '[Deamidation 18O (N)]', '[Deamidation (NQ)]',
+    '[Hydroxyproline]', '[Carbamyl (N-term)]', '[Delta:H(2)C(2) (N-term)]', '[Dioxidation (MW)]', '[Trioxidation (C)]',
+    '[Dethiomethyl (M)]', '[Cation:Na (DE)]', '[Methyl (E)]', '[Dehydrated (ST)]', '[Oxidation (P)]', '[Dimethyl (K)]',
+    '[Amidated (Protein C-term)]', '[Sulfo (STY)]', '[Acetyl (N-term)]', '[Amidated (C-term)]', '[Sulfation (Y)]',
+    '[Phospho (ST)]', '[Cys-Cys]', '[Cysteinyl]', '[Cysteinyl - carbamidomethyl]', '[Oxidation (MP)]']})
+
+# The protein sequences and descriptions are taken from the compact proteome of the fasta file.
+from .organisms_data import get_sequence, get_description
+# The peptides of a protein are selected from the per-protein index of each formatted dataset.
+from .preprocessing import get_protein_data
 
 # Cell
 import numpy as np
@@ -92,87 +141,293 @@ def get_plot_data(protein,df,fasta):
         pd.DataFrame: Formatted dataframe for plotting.
 
     """
-    protein_sequence = fasta[protein].sequence
-    df_prot = df[df.unique_protein_id==protein]
+    protein_sequence = get_sequence(fasta, protein)
+    # the peptides of the protein are taken from the per-protein index of the dataset
+    df_prot = get_protein_data(df, protein)
 
     if df_prot.shape[0] == 0:
         df_plot = None
     else:
-        df_peps = [np.arange(row['start'], row['end']+1) for _, row in df_prot.iterrows()]
-        df_peps  = pd.DataFrame.from_records(data=df_peps)
-        df_peps['modified_sequence'] = df_prot['modified_sequence'].values
-        df_peps['all_protein_ids'] = df_prot['all_protein_ids'].values
-        df_peps = df_peps.melt(id_vars=['modified_sequence','all_protein_ids'])
-        df_peps = df_peps[['modified_sequence','all_protein_ids','value']].dropna()
-        df_peps = df_peps.rename(columns={"value": "seq_position"})
-        df_peps['marker_symbol'] = 1
-        df_peps['marker_size'] = 8
-        df_peps['PTM'] = np.NaN
-        df_peps['PTMtype'] = np.NaN
-        df_peps['PTMshape'] = np.NaN
-        unique_pep = df_peps.modified_sequence.unique()
-        for uid in unique_pep:
-            df_peps_uid = df_peps[df_peps.modified_sequence==uid]
-            start_uid = np.min(df_peps_uid.seq_position)
-            end_uid = np.max(df_peps_uid.seq_position)
-            df_peps['marker_symbol'] = np.where(df_peps.seq_position == start_uid, 7, df_peps.marker_symbol)
-            df_peps['marker_symbol'] = np.where(df_peps.seq_position == end_uid, 8, df_peps.marker_symbol)
-            df_peps['marker_size'] = np.where(df_peps.seq_position == start_uid, 6, df_peps.marker_size)
-            df_peps['marker_size'] = np.where(df_peps.seq_position == end_uid, 6, df_peps.marker_size)
-
-            df_PTMs_uid = df_prot[df_prot.modified_sequence==uid]
-            #PTMsites = df_PTMs_uid.PTMsites.tolist()[0] + start_uid
-            PTMsites = [x+start_uid for x in df_PTMs_uid.PTMsites.tolist()[0]]
-            PTMtypes = df_PTMs_uid.PTMtypes.tolist()[0]
-
-            #print(PTMsites)
-            #print(PTMtypes)
-
-            for i in range(0,len(PTMsites)):
-                df_peps['PTM'] = np.where(df_peps["seq_position"]==PTMsites[i], 1, df_peps.PTM)
-                df_peps['PTMtype'] = np.where(df_peps["seq_position"]==PTMsites[i], PTMtypes[i], df_peps.PTMtype)
-
-            #print(df_peps)
-
-            df_seq = pd.DataFrame({'seq_position':np.arange(0,len(protein_sequence))})
-
-            df_plot = pd.merge(df_seq, df_peps, how='left', on='seq_position')
-            df_plot['height']=0
-            df_plot['color']="grey"
-
-            unique_mods = df_plot['PTMtype'].dropna().unique()
-            if len(unique_mods) > 0:
-                for mod in df_plot['PTMtype'].dropna().unique():
-                    if mod != 'nan':
-                        #print(mod)
-                        if mod not in ptm_shape_dict.keys():
-                            ptm_shape_dict.update({mod : 17})
-
-                        df_plot.loc[df_plot.PTMtype == mod, 'PTMshape'] = ptm_shape_dict[mod]
-                        #df_plot.loc[df_plot.PTMtype == mod, 'PTMshape'] = 17
-
-        #print(df_plot)
-
-        df_plot['modified_sequence']= df_plot['modified_sequence'].astype(str)
-        df_plot = df_plot.groupby('seq_position').agg({'modified_sequence':'; '.join,
-                                                       'all_protein_ids': 'first',
-                                                       'marker_symbol': 'first',
-                                                       'marker_size': 'first',
-                                                       'PTM': 'first',
-                                                       'PTMtype': 'first',
-                                                       'PTMshape': 'first',
-                                                       'height': 'first',
-                                                       'color': 'first'
-                                                      }).reset_index()
-
-        #print(df_plot)
+        n_positions = len(protein_sequence)
+        starts = df_prot['start'].values.astype(np.int64)
+        ends = df_prot['end'].values.astype(np.int64)
+
+        # expand the intervals of all peptides to one row per covered sequence position
+        lengths = ends - starts + 1
+        pep_idx = np.repeat(np.arange(df_prot.shape[0]), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = starts[pep_idx] + offsets
+        # peptides at the same position are ordered by their offset in the peptide and then by their order in df
+        order = np.lexsort((pep_idx, offsets, positions))
+        pep_idx, positions = pep_idx[order], positions[order]
+        in_sequence = (positions >= 0) & (positions < n_positions)
+        pep_idx, positions = pep_idx[in_sequence], positions[in_sequence]
+        covered = np.zeros(n_positions, dtype=bool)
+        covered[positions] = True
+
+        # start and end of every unique peptide, later peptides overwrite the markers of earlier ones
+        df_unique = df_prot.drop_duplicates(subset='modified_sequence')
+        bounds = df_prot.groupby('modified_sequence', sort=False).agg(start=('start', 'min'), end=('end', 'max'))
+        bounds = bounds.loc[df_unique.modified_sequence]
+        start_uid = bounds['start'].values.astype(np.int64)
+        end_uid = bounds['end'].values.astype(np.int64)
+        marker_idx = np.stack([start_uid, end_uid], axis=1).ravel()
+        marker_values = np.tile([7, 8], len(start_uid))
+        valid = (marker_idx >= 0) & (marker_idx < n_positions)
+        marker_symbol = np.ones(n_positions, dtype=np.int64)
+        marker_symbol[marker_idx[valid]] = marker_values[valid]
+        marker_size = np.full(n_positions, 8, dtype=np.int64)
+        marker_size[marker_idx[valid]] = 6
+
+        # PTM sites of the first occurrence of every unique peptide, later sites overwrite earlier ones
+        ptm_sites = df_unique.PTMsites.tolist()
+        ptm_types = df_unique.PTMtypes.tolist()
+        n_sites = np.array([len(sites) for sites in ptm_sites], dtype=np.int64)
+        site_idx = np.repeat(start_uid, n_sites) + np.array([site for sites in ptm_sites for site in sites], dtype=np.int64)
+        site_types = np.array([ptm for types in ptm_types for ptm in types], dtype=object)
+        valid = (site_idx >= 0) & (site_idx < n_positions)
+        valid[valid] = covered[site_idx[valid]]
+        ptm = np.full(n_positions, np.NaN)
+        ptm[site_idx[valid]] = 1
+        ptm_type = np.full(n_positions, np.NaN, dtype=object)
+        if n_sites.sum() > 0:
+            # positions without a PTM are marked with 'nan' as soon as the protein has any PTM site
+            ptm_type[covered] = 'nan'
+            ptm_type[site_idx[valid]] = site_types[valid]
+        ptm_shape = np.full(n_positions, np.NaN)
+        for mod in pd.unique(site_types[valid]):
+            ptm_shape[ptm_type == mod] = get_ptm_shape(mod)
+
+        # positions that are covered by more than one peptide list all of them
+        modified_sequence = np.full(n_positions, 'nan', dtype=object)
+        all_protein_ids = np.full(n_positions, np.NaN, dtype=object)
+        first_row = np.ones(len(positions), dtype=bool)
+        first_row[1:] = positions[1:] != positions[:-1]
+        modified_sequence[positions[first_row]] = df_prot['modified_sequence'].values[pep_idx[first_row]]
+        all_protein_ids[positions[first_row]] = df_prot['all_protein_ids'].values[pep_idx[first_row]]
+        if not first_row.all():
+            shared = np.isin(positions, positions[~first_row])
+            shared_sequences = pd.Series(df_prot['modified_sequence'].values[pep_idx[shared]]).astype(str)
+            shared_sequences = shared_sequences.groupby(positions[shared], sort=False).agg('; '.join)
+            modified_sequence[shared_sequences.index.values] = shared_sequences.values
+
+        if not covered.all():
+            marker_symbol = np.where(covered, marker_symbol, np.NaN)
+            marker_size = np.where(covered, marker_size, np.NaN)
+
+        df_plot = pd.DataFrame({'seq_position': np.arange(n_positions),
+                                'modified_sequence': modified_sequence,
+                                'all_protein_ids': all_protein_ids,
+                                'marker_symbol': marker_symbol,
+                                'marker_size': marker_size,
+                                'PTM': ptm,
+                                'PTMtype': ptm_type,
+                                'PTMshape': ptm_shape,
+                                'height': 0,
+                                'color': "grey"})
+        if n_sites.sum() == 0:
+            df_plot['PTMtype'] = df_plot['PTMtype'].astype(float)
 
     return(df_plot)
 
+# Cell
+import weakref
+from collections import OrderedDict
+
+class LRUCache():
+    """
+    Least recently used cache with a memory budget.
+    The least recently used entries are evicted as soon as the size of all entries exceeds the budget.
+
+    Args:
+        max_bytes (int): Memory budget of the cache in bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value, n_bytes: int):
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key)[1]
+        # entries that are larger than the complete budget are not cached
+        if n_bytes > self.max_bytes:
+            return
+        self._entries[key] = (value, n_bytes)
+        self.n_bytes += n_bytes
+        while self.n_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.n_bytes -= evicted_bytes
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
+
+# Cache of the per-protein plot data of each dataset, the budget can be changed with plot_data_cache.max_bytes.
+plot_data_cache = LRUCache(max_bytes=256*1024**2)
+
+def get_cached_plot_data(protein, df, fasta):
+    """
+    Function to get the formatted plot data of a protein from the plot data cache.
+    The cache key covers the identity of the dataset and the fasta, so a new dataset is never served from the cache.
+
+    Args:
+        protein (str): Uniprot protein accession.
+        df (pd.DataFrame): Experimental data imported and formatted according to alphamap standards.
+        fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+    Returns:
+        pd.DataFrame: A copy of the formatted dataframe for plotting, 'None' if the protein is not in df.
+
+    """
+    key = (id(df), df.shape[0], id(fasta), protein)
+    entry = plot_data_cache.get(key)
+    if entry is None or entry[0]() is not df or entry[1]() is not fasta:
+        df_plot = get_plot_data(protein=protein, df=df, fasta=fasta)
+        n_bytes = 1024 if df_plot is None else 1024 + int(df_plot.memory_usage(deep=True).sum())
+        entry = (weakref.ref(df), weakref.ref(fasta), df_plot)
+        plot_data_cache.put(key, entry, n_bytes)
+    df_plot = entry[2]
+    # the plot functions set the colors and heights of the datasets, so the cached data is copied
+    return None if df_plot is None else df_plot.copy()
+
 # Cell
 import plotly.graph_objects as go
 
-def plot_single_peptide_traces(df_plot,protein,fasta):
+# Number of residues or plotted points above which the 'auto' render mode switches to WebGL traces.
+webgl_point_threshold = 5000
+
+def get_scatter_trace(n_points: int, render_mode: str = 'svg'):
+    """
+    Function to select the scatter trace type of the sequence plot for a render mode.
+
+    Args:
+        n_points (int): Number of residues or points that are plotted.
+        render_mode (str, optional): 'svg', 'webgl' or 'auto'. In the 'auto' mode WebGL is used above the webgl_point_threshold. Default is 'svg'.
+    Returns:
+        type: go.Scatter or go.Scattergl.
+
+    """
+    if render_mode == 'svg':
+        return go.Scatter
+    elif render_mode == 'webgl':
+        return go.Scattergl
+    elif render_mode == 'auto':
+        return go.Scattergl if n_points > webgl_point_threshold else go.Scatter
+    else:
+        raise ValueError(f"Render mode {render_mode} is not available. Please select one of the following: ['svg', 'webgl', 'auto']")
+
+# Maximal number of visible residues for which every residue letter is shown on the sequence axis.
+max_sequence_ticks = 300
+
+# Zoom-level tables of the sequence axis of the last plotted proteins, see get_sequence_tick_levels.
+sequence_tick_levels_cache = LRUCache(max_bytes=64*1024**2)
+
+def get_sequence_tick_levels(protein_sequence: str, max_ticks: int = max_sequence_ticks):
+    """
+    Function to get the precomputed zoom-level table of the sequence axis of a protein.
+    Each zoom level labels every n-th residue with n in 1, 2, 5, 10, 20, 50, ... up to the first n that labels at most
+    max_ticks residues of the complete sequence. The table is computed once per protein and kept in sequence_tick_levels_cache.
+
+    Args:
+        protein_sequence (str): Amino acid sequence of the protein.
+        max_ticks (int, optional): Maximal number of labeled residues in the visible range. Default is max_sequence_ticks.
+    Returns:
+        list: The step n, the positions and the residue letters of the ticks of each zoom level.
+
+    """
+    key = (protein_sequence, max_ticks)
+    levels = sequence_tick_levels_cache.get(key)
+    if levels is None:
+        residues = np.array(list(protein_sequence))
+        levels = []
+        for step in (m * 10**e for e in range(8) for m in (1, 2, 5)):
+            tickvals = np.arange(step, len(protein_sequence) + 1, step)
+            levels.append((step, tickvals, residues[tickvals - 1]))
+            if len(protein_sequence) <= step * max_ticks:
+                break
+        n_bytes = len(protein_sequence) + sum([tickvals.nbytes + ticktext.nbytes for _, tickvals, ticktext in levels])
+        sequence_tick_levels_cache.put(key, levels, n_bytes)
+    return levels
+
+def get_sequence_ticks(protein_sequence: str, x_range: list = None, max_ticks: int = max_sequence_ticks):
+    """
+    Function to get the level-of-detail ticks of the sequence axis for the visible part of a protein.
+    If more than max_ticks residues are visible, only every n-th residue is labeled with n in 1, 2, 5, 10, 20, 50, ...
+    One view width on either side of the visible range is labeled as well, so panning stays labeled.
+    The ticks are sliced from the zoom-level table of get_sequence_tick_levels.
+
+    Args:
+        protein_sequence (str): Amino acid sequence of the protein.
+        x_range (list, optional): Visible [start, end] positions of the sequence axis. Default is None for the complete sequence.
+        max_ticks (int, optional): Maximal number of labeled residues in the visible range. Default is max_sequence_ticks.
+    Returns:
+        (np.ndarray, list): The positions and the residue letters of the ticks.
+
+    """
+    if x_range is None:
+        start, end = 1, len(protein_sequence)
+    else:
+        start, end = int(np.ceil(min(x_range))), int(np.floor(max(x_range)))
+    n_visible = max(end - start + 1, 1)
+    levels = get_sequence_tick_levels(protein_sequence, max_ticks)
+    # a view that is wider than the complete sequence uses the coarsest level
+    _, tickvals, ticktext = next((level for level in levels if n_visible <= level[0] * max_ticks), levels[-1])
+    first = np.searchsorted(tickvals, start - n_visible, side='left')
+    last = np.searchsorted(tickvals, end + n_visible, side='right')
+    return tickvals[first:last], ticktext[first:last].tolist()
+
+def update_sequence_axis(fig: go.Figure, protein_sequence: str, x_range: list = None):
+    """
+    Function to set the ticks of the sequence axis of a sequence plot for the visible part of a protein.
+    The range is set as well, so an updated figure is not reset to the complete sequence.
+
+    Args:
+        fig (go.Figure): Sequence plot of the protein.
+        protein_sequence (str): Amino acid sequence of the protein.
+        x_range (list, optional): Visible [start, end] positions of the sequence axis. Default is None for the complete sequence.
+
+    """
+    tickvals, ticktext = get_sequence_ticks(protein_sequence, x_range)
+    if x_range is None:
+        x_range = [-10, len(protein_sequence)+10]
+    fig.update_layout(
+        xaxis=dict(tickvals=tickvals, ticktext=ticktext, range=list(x_range)),
+        xaxis2=dict(range=list(x_range))
+    )
+
+def link_sequence_axis(fig: go.Figure, protein_sequence: str):
+    """
+    Function to get an interactive sequence plot for Jupyter notebooks that shows the residue letters of the sequence
+    axis when zooming in. The figure is shown as a plotly FigureWidget, which needs the ipywidgets package.
+
+    Args:
+        fig (go.Figure): Sequence plot of the protein, as returned by plot_peptide_traces.
+        protein_sequence (str): Amino acid sequence of the protein.
+    Returns:
+        go.FigureWidget: Sequence plot whose sequence axis is updated from the zoom-level table on every zoom.
+
+    """
+    widget = go.FigureWidget(fig)
+    def update_ticks(axis, x_range):
+        # setting the same range again doesn't call the callback, so only the ticks are changed
+        update_sequence_axis(widget, protein_sequence, x_range)
+    widget.layout.xaxis.on_change(update_ticks, 'range')
+    return widget
+
+def plot_single_peptide_traces(df_plot,protein,fasta,render_mode='svg'):
     """
     Function to plot single peptide trace.
 
@@ -180,13 +435,17 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
         df_plot (pd.DataFrame): Formatted dataframe for plotting, generated by get_plot_data.
         protein (str): Uniprot protein accession.
         fasta (fasta): Fasta file imported by pyteomics 'fasta.IndexedUniProt'.
+        render_mode (str, optional): 'svg', 'webgl' or 'auto' rendering of the peptide, PTM and stem traces. Default is 'svg'.
     Returns:
         go.Figure: Figure data for a single dataset.
 
     """
-    protein_sequence = fasta[protein].sequence
-    entry_name = fasta[protein].description['GN']
-    protein_name = fasta[protein].description['name']
+    protein_sequence = get_sequence(fasta, protein)
+    protein_description = get_description(fasta, protein)
+    entry_name = protein_description['GN']
+    protein_name = protein_description['name']
+
+    scatter = get_scatter_trace(max(len(protein_sequence), df_plot.shape[0]), render_mode)
 
     plot0 = go.Scatter(y=[None],
                        name='',
@@ -196,7 +455,7 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
     ## Peptide backbone
     df_plot_pep = df_plot.dropna(subset=['modified_sequence'])
     df_plot_pep = df_plot_pep[~df_plot_pep.modified_sequence.str.contains('nan')]
-    plot1 = go.Scatter(x=df_plot_pep.seq_position+1,
+    plot1 = scatter(x=df_plot_pep.seq_position+1,
                        y=df_plot.height,
                        xaxis='x2',
                        mode='markers',
@@ -219,7 +478,7 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
     ## PTM dots
     df_plot_ptm = df_plot.dropna(subset=['PTM'])
     #print(df_plot_ptm)
-    plot2 = go.Scatter(x=df_plot_ptm.seq_position+1,
+    plot2 = scatter(x=df_plot_ptm.seq_position+1,
                        y=df_plot_ptm.height+0.3,
                        xaxis='x2',
                        mode='markers',
@@ -234,6 +493,25 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
                        name='',
                        showlegend=False)
 
+    ## PTM stems, drawn as a single line trace with None-separated segments
+    stem_x = np.repeat(df_plot_ptm.seq_position.values+1, 3).astype(object)
+    stem_y = np.repeat(df_plot_ptm.height.values, 3).astype(object)
+    stem_y[1::3] = stem_y[1::3]+0.3
+    stem_x[2::3] = None
+    stem_y[2::3] = None
+    plot3 = scatter(x=stem_x,
+                       y=stem_y,
+                       xaxis='x2',
+                       mode='lines',
+                       line=dict(color=df_plot.color.values[0],
+                                 width=1),
+                       hoverinfo='skip',
+                       name='',
+                       showlegend=False)
+
+    # coarse ticks of the sequence axis, per-residue letters are only added when zooming in
+    sequence_tickvals, sequence_ticktext = get_sequence_ticks(protein_sequence)
+
     layout = go.Layout(
             yaxis=dict(
                 title = "",
@@ -247,8 +525,8 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
                 title= 'protein sequence',
                 tickmode = 'array',
                 range=[-10, len(protein_sequence)+10],
-                tickvals = np.arange(1,len(protein_sequence)+1),
-                ticktext = list(protein_sequence),
+                tickvals = sequence_tickvals,
+                ticktext = sequence_ticktext,
                 tickangle=0,
                 matches="x2",
                 type="linear",
@@ -278,30 +556,13 @@ def plot_single_peptide_traces(df_plot,protein,fasta):
         margin = dict(l=20, r=20, t=150, b=20)
         )
 
-    fig = go.Figure(data=[plot1,plot2,plot0], layout=layout)
+    fig = go.Figure(data=[plot3,plot1,plot2,plot0], layout=layout)
 
     #print(fig.layout.meta)
 
-    for i in range(0, df_plot_ptm.shape[0]):
-            fig.add_shape(
-                    dict(
-                        type="line",
-                        xref="x2",
-                        x0=df_plot_ptm.seq_position.values[i] +1,
-                        y0=df_plot_ptm.height.values[i],
-                        x1=df_plot_ptm.seq_position.values[i] +1,
-                        y1=df_plot_ptm.height.values[i]+0.3,
-                        line=dict(
-                            color=df_plot_ptm.color.values[i],
-                            width=1
-                        )
-                    )
-            )
-
     return fig
 
 # Cell
-
 # Color palettes used for the different uniprot annotation features
 custom_color_palettes = {
     'col_greens':["#5C965D","#6AA16B","#77AC78","#84B786","#91C193","#9FCCA1","#B3DCB5","#C6EBC9"],
@@ -313,7 +574,6 @@ custom_color_palettes = {
 }
 
 # Cell
-
 # The uniprot_color_dict maps each uniprot annotation feature to a color in the custom_color_palettes.
 uniprot_color_dict = {'CHAIN': custom_color_palettes['col_greens'][0],
                       'INIT_MET': custom_color_palettes['col_greens'][1],
@@ -365,7 +625,6 @@ uniprot_color_dict = {'CHAIN': custom_color_palettes['col_greens'][0],
                      }
 
 # Cell
-
 # Dictionary that maps one-letter amino acid abbreviations to their full name.
 aa_color_dict = {'A':'Alanine',
                  'R':'Arginine',
@@ -391,10 +650,39 @@ aa_color_dict = {'A':'Alanine',
                  'U':'nan'}
 
 # Cell
-
 import plotly.graph_objects as go
 from .proteolytic_cleavage import get_cleavage_sites
 
+def get_feature_track_segments(domain_info: pd.DataFrame, uniprot_color_dict: dict):
+    """
+    Function to split the annotations of a single uniprot feature into non-overlapping segments for plotting.
+
+    Args:
+        domain_info (pd.DataFrame): Formatted uniprot annotations of a single feature.
+        uniprot_color_dict (dict): Uniprot color dictionary defined by alphamap.
+    Returns:
+        (np.ndarray, np.ndarray, list, list): The center and width of each segment, the annotations of all instances that cover a segment separated by '<br>' and the color of the last instance that covers a segment.
+
+    """
+    starts = domain_info.start.values.astype(int)
+    ends = np.where(np.isnan(domain_info.end.values.astype(float)), starts, domain_info.end.values)
+    ends = ends.astype(int)
+    annotations = domain_info.annotation.values
+    colors = [uniprot_color_dict[a] if f == "STRUCTURE" else uniprot_color_dict[f] for f, a in zip(domain_info.feature, annotations)]
+
+    # the segments are the intervals between all start and end positions of the instances
+    breaks = np.unique(np.concatenate([starts, ends + 1]))
+    centers, widths, texts, segment_colors = [], [], [], []
+    for left, right in zip(breaks[:-1], breaks[1:]):
+        covering = np.flatnonzero((starts <= left) & (ends >= left))
+        if len(covering) == 0:
+            continue
+        centers.append((left + right - 1) / 2)
+        widths.append(right - left)
+        texts.append('<br>'.join([str(annotations[i]) for i in covering]))
+        segment_colors.append(colors[covering[-1]])
+    return np.array(centers), np.array(widths), texts, segment_colors
+
 def plot_peptide_traces(df: pd.DataFrame or list,
                         name: str or list,
                         protein: str,
@@ -405,10 +693,13 @@ def plot_peptide_traces(df: pd.DataFrame or list,
                         uniprot_color_dict: dict,
                         selected_proteases: list = [],
                         dashboard: bool = False,
-                        trace_colors: list = []):
+                        trace_colors: list = [],
+                        render_mode: str = 'svg'):
 
     """
     Function to generate the sequence plot.
+    The sequence axis of a long protein only shows every n-th residue, link_sequence_axis shows the residue letters when
+    zooming into the plot in a Jupyter notebook.
 
     Args:
         df (pd.DataFrame/list): Single dataframe or list of dataframes containing the datasets to plot.
@@ -422,6 +713,7 @@ def plot_peptide_traces(df: pd.DataFrame or list,
         selected_proteases (list, optional): List of proteases to plot. Default is an empty list.
         dashboard (bool, optional): Flag if the function is called from the dashboard. Default is 'False'.
         trace_colors (list, optional): List of manualy selected colors for each dataset in df. Default is an empty list.
+        render_mode (str, optional): 'svg', 'webgl' or 'auto' rendering of the residue, peptide and PTM traces. In the 'auto' mode WebGL is used for proteins or datasets with more than webgl_point_threshold points. Default is 'svg'.
 
     Returns:
         go.Figure: Sequence plot.
@@ -430,7 +722,7 @@ def plot_peptide_traces(df: pd.DataFrame or list,
 
     figure_height = 200
 
-    protein_sequence = fasta[protein].sequence
+    protein_sequence = get_sequence(fasta, protein)
 
     # colors for experimental data traces
     if len(trace_colors) == 0:
@@ -443,24 +735,22 @@ def plot_peptide_traces(df: pd.DataFrame or list,
     uniprot_feature_dict_rev = {v: k for k, v in uniprot_feature_dict.items()}
     #uniprot_feature_dict_rev["STRUCTURE"] = "Secondary structure"
 
-    # subsetting of the uniprot annotation to the selected features
-    uniprot_annotation_p = uniprot[uniprot.protein_id==protein]
-    # formatting of uniprot annotations
-    uniprot_annotation_p_f = format_uniprot_annotation(uniprot_annotation_p, uniprot_feature_dict)
+    # formatted uniprot annotation of the protein, taken from the per-protein index of the annotation table
+    uniprot_annotation_p_f = get_protein_annotation(uniprot, protein, uniprot_feature_dict)
     # subset for selected features
     uniprot_annotation_p_f_f = uniprot_annotation_p_f[uniprot_annotation_p_f.feature.isin(selected_features)]
 
     if isinstance(df, pd.DataFrame):
-        df_plot = get_plot_data(protein=protein,
-                              df = df,
-                              fasta = fasta)
+        df_plot = get_cached_plot_data(protein=protein,
+                                       df = df,
+                                       fasta = fasta)
 
         df_plot.color = colors[0]
 
         observed_mods = list(set(df_plot.PTMtype))
-        ptm_shape_dict_sub = {key: ptm_shape_dict[key] for key in observed_mods if key in ptm_shape_dict}
+        ptm_shape_dict_sub = {key: get_ptm_shape(key) for key in observed_mods if isinstance(key, str) and key != 'nan'}
 
-        fig = plot_single_peptide_traces(df_plot,protein=protein,fasta = fasta)
+        fig = plot_single_peptide_traces(df_plot,protein=protein,fasta = fasta,render_mode=render_mode)
 
         AA_coverage = fig.layout.meta
         trace_name = [name + "<br> (" + str(AA_coverage) + "% coverage)"]
@@ -475,9 +765,9 @@ def plot_peptide_traces(df: pd.DataFrame or list,
 
     elif isinstance(df, list):
 
-        df_plot = [get_plot_data(protein=protein,
-                               df = d,
-                               fasta = fasta) for d in df]
+        df_plot = [get_cached_plot_data(protein=protein,
+                                        df = d,
+                                        fasta = fasta) for d in df]
 
         # Subset data and annotations for the samples where the selected protein was detected
         valid_idx = []
@@ -492,19 +782,16 @@ def plot_peptide_traces(df: pd.DataFrame or list,
         for i in range(len(df_plot)):
             observed_mods.extend(list(set(df_plot[i].PTMtype)))
         observed_mods = list(set(observed_mods))
-        ptm_shape_dict_sub = {key: ptm_shape_dict[key] for key in observed_mods if key in ptm_shape_dict}
+        ptm_shape_dict_sub = {key: get_ptm_shape(key) for key in observed_mods if isinstance(key, str) and key != 'nan'}
 
         for i in range(len(df_plot)):
             df_plot[i].color = colors[i]
             df_plot[i].height = 1+i
 
-        plot_list = [plot_single_peptide_traces(df,protein=protein,fasta = fasta) for df in df_plot]
+        plot_list = [plot_single_peptide_traces(df,protein=protein,fasta = fasta,render_mode=render_mode) for df in df_plot]
         new_data = [p.data for p in plot_list]
         new_data = sum(new_data, ())
         new_layout = plot_list[0].layout
-        shapes = [p.layout.shapes for p in plot_list]
-        shapes = sum(shapes, ())
-        new_layout.shapes = new_layout.shapes + tuple(shapes)
         AA_coverage = [p.layout.meta for p in plot_list]
         trace_name = [n + "<br> (" + str(c) + "% coverage)" for n,c in zip(name,AA_coverage)]
 
@@ -544,33 +831,23 @@ def plot_peptide_traces(df: pd.DataFrame or list,
 
             domain = unique_features[j]
             domain_info_sub = uniprot_annotation_p_f_f[uniprot_annotation_p_f_f.feature==domain].reset_index(drop=True)
-            for i in range(0, domain_info_sub.shape[0]):
-                start = int(domain_info_sub.start[i])
-                end = domain_info_sub.end[i]
-                if np.isnan(domain_info_sub.end[i]):
-                    end=start #+1
-                else:
-                    end=int(end)
-
-                if domain_info_sub.feature[i] == "STRUCTURE":
-                    marker_col = uniprot_color_dict[domain_info_sub.annotation[i]]
-                else:
-                    marker_col = uniprot_color_dict[domain_info_sub.feature[i]]
-
-                fig.add_trace(go.Bar(x=list(range(start,end+1)),
-                                     y=list(np.repeat(0.2,end-start+1)),
-                                     base=list(np.repeat(y_max+(j/2),end-start+1)-0.1),
-                                     marker_color=marker_col,
-                                     marker_line_width=0,
-                                     opacity=0.8,
-                                     showlegend=False,
-                                     xaxis='x2',
-                                     name='',
-                                     text=np.repeat(domain_info_sub.annotation[i],len(range(start,end+1))),
-                                     hovertemplate ='%{text}'
-                                     #hovertext=domain_info_sub.annotation[i],
-                                     #hoverinfo='text'
-                                    ))
+            # a single trace per feature, overlapping instances are combined in the hover text
+            centers, widths, texts, marker_cols = get_feature_track_segments(domain_info_sub, uniprot_color_dict)
+
+            fig.add_trace(go.Bar(x=centers,
+                                 y=np.repeat(0.2,len(centers)),
+                                 width=widths,
+                                 base=np.repeat(y_max+(j/2),len(centers))-0.1,
+                                 marker_color=marker_cols,
+                                 marker_line_width=0,
+                                 opacity=0.8,
+                                 showlegend=False,
+                                 xaxis='x2',
+                                 name='',
+                                 text=texts,
+                                 textposition='none',
+                                 hovertemplate ='%{text}'
+                                ))
         fig.update_layout(barmode='stack', bargap=0, hovermode='x unified',hoverdistance=1)
 
     selected_proteases = sorted(selected_proteases)
@@ -583,23 +860,24 @@ def plot_peptide_traces(df: pd.DataFrame or list,
             figure_height = figure_height + 50
 
             protease = selected_proteases[u]
-            sites = get_cleavage_sites(protein_sequence,protease)
-            for s in sites:
-                fig.add_trace(go.Bar(x=list(range(s+1,s+2)),
-                                     y=[0.2],
-                                     base=y_max+(len(unique_features)/2)+(u/2)-0.1,
-                                     marker_color="grey",
-                                     opacity=0.8,
-                                     showlegend=False,
-                                     xaxis='x2',
-                                     name='',
-                                     text=np.repeat(protease,len(range(s+1,s+2))),
-                                     hovertemplate ='%{text}'
-                                     #hovertext=protease,
-                                     #hoverinfo='text'
-                                    ))
-
-    fig.add_trace(go.Scatter(x=np.arange(1,len(protein_sequence)+1,1),
+            # a single trace per protease, the cleavage sites are cached per sequence and protease
+            sites = np.array(get_cleavage_sites(protein_sequence,protease), dtype=int)
+            fig.add_trace(go.Bar(x=sites+1,
+                                 y=np.repeat(0.2,len(sites)),
+                                 width=np.ones(len(sites)),
+                                 base=np.repeat(y_max+(len(unique_features)/2)+(u/2),len(sites))-0.1,
+                                 marker_color="grey",
+                                 marker_line_width=0,
+                                 opacity=0.8,
+                                 showlegend=False,
+                                 xaxis='x2',
+                                 name='',
+                                 text=np.repeat(protease,len(sites)),
+                                 textposition='none',
+                                 hovertemplate ='%{text}'
+                                ))
+
+    fig.add_trace(get_scatter_trace(len(protein_sequence), render_mode)(x=np.arange(1,len(protein_sequence)+1,1),
                         y=np.repeat(0,len(protein_sequence)),
                         marker=dict(color='rgba(135, 206, 250, 0)'),
                         name='',
@@ -652,6 +930,221 @@ def plot_peptide_traces(df: pd.DataFrame or list,
 
 # Cell
 from .pdflib import *
+import os
+import json
+import shutil
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from .proteolytic_cleavage import protease_dict
+from .preprocessing import get_file_fingerprint
+
+def _build_report_figure(protein: str, proteases: dict, **plot_args):
+    # the custom enzyme of the dashboard is only set in the parent process
+    protease_dict.update(proteases)
+    return plot_peptide_traces(protein=protein, **plot_args)
+
+def export_report_figures(proteins: list, plot_args: dict, n_processes: int = None):
+    """
+    Function to build and export the figures of a pdf report in a process pool.
+
+    Args:
+        proteins (list): List of uniprot protein accessions.
+        plot_args (dict): Arguments of plot_peptide_traces that are shared by all proteins.
+        n_processes (int, optional): Number of processes of the export pool, see pdflib.get_export_pool. Default is 'None' for one process per cpu core.
+    Returns:
+        generator: The exported figures in the order of the proteins.
+
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count()
+    if n_processes <= 1 or len(proteins) <= 1:
+        for protein in proteins:
+            yield ExportedFigure(plot_peptide_traces(protein=protein, **plot_args))
+    else:
+        # only the data of the proteins is sent to the processes, once per process instead of once per protein
+        plot_args = dict(plot_args)
+        if isinstance(plot_args['df'], pd.DataFrame):
+            plot_args['df'] = plot_args['df'][plot_args['df'].unique_protein_id.isin(proteins)]
+        else:
+            plot_args['df'] = [d[d.unique_protein_id.isin(proteins)] for d in plot_args['df']]
+        plot_args['uniprot'] = plot_args['uniprot'][plot_args['uniprot'].protein_id.isin(proteins)]
+        # the pool and its kaleido processes are kept alive for the next report
+        yield from get_export_pool(n_processes).build_and_export(_build_report_figure, proteins,
+                                                                 dict(plot_args, proteases=dict(protease_dict)))
+
+report_footer_text = '<font size="20">This report was generated by <a href="https://github.com/MannLabs/alphamap" color="darkblue"><b>AlphaMap</b></a>.</font>'
+
+def _get_report_data_hash(df: pd.DataFrame, protein_column: str, proteins: list):
+    # only the rows of the proteins are part of the report, lists like the PTM sites are hashed as strings
+    df = df[df[protein_column].isin(proteins)]
+    data_hash = hashlib.sha1()
+    for column in df.columns:
+        try:
+            values = pd.util.hash_pandas_object(df[column], index=False)
+        except TypeError:
+            values = pd.util.hash_pandas_object(df[column].astype(str), index=False)
+        data_hash.update(str(column).encode('utf-8'))
+        data_hash.update(values.values.tobytes())
+    return data_hash.hexdigest()
+
+def get_report_key(proteins: list, plot_args: dict, page_height: int):
+    """
+    Function to get the key of a pdf report from its proteins, data and options, used to resume an interrupted report.
+    The datasets and the uniprot annotation are hashed by the content of the rows of the proteins,
+    the fasta file by its path and fingerprint, so a report of other data never reuses the pages of another report.
+
+    Args:
+        proteins (list): List of uniprot protein accessions.
+        plot_args (dict): Arguments of plot_peptide_traces that are shared by all proteins.
+        page_height (int): Height of the report pages.
+    Returns:
+        str: The sha1 hash of the proteins, the data and the options of the report.
+
+    """
+    datasets = [plot_args['df']] if isinstance(plot_args['df'], pd.DataFrame) else plot_args['df']
+    fasta_file = getattr(getattr(plot_args['fasta'], '_source', None), 'name', None)
+    report_info = {'proteins': list(proteins),
+                   'name': plot_args['name'],
+                   'datasets': [_get_report_data_hash(d, 'unique_protein_id', proteins) for d in datasets],
+                   'fasta': os.path.abspath(fasta_file) if fasta_file else None,
+                   'fasta_fingerprint': get_file_fingerprint(fasta_file) if fasta_file else None,
+                   'uniprot': _get_report_data_hash(plot_args['uniprot'], 'protein_id', proteins),
+                   'selected_features': list(plot_args['selected_features']),
+                   'selected_proteases': list(plot_args['selected_proteases']),
+                   'proteases': {p: protease_dict.get(p) for p in plot_args['selected_proteases']},
+                   'trace_colors': list(plot_args['trace_colors']),
+                   'page_height': page_height}
+    return hashlib.sha1(json.dumps(report_info, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+# Locks of the reports that are streamed by this process, so two threads never write the same report.
+_report_locks = defaultdict(threading.Lock)
+
+def stream_pdf_report(proteins: list,
+                      plot_args: dict,
+                      output_file: str,
+                      page_height: int,
+                      n_processes: int = None,
+                      progress_callback = None):
+    """
+    Function to stream a pdf report to a file on disk.
+    Every page is written to its own file in the folder output_file + '.parts' as soon as it is rendered.
+    A report that was interrupted is resumed from these pages if it is started again with the same proteins, data and options.
+    When all pages are rendered, they are concatenated page by page into output_file and the folder is removed.
+    If output_file is a folder, the report is written to a file in it that is named after the report key,
+    so reports of different data or options never share their files.
+
+    Args:
+        proteins (list): List of uniprot protein accessions.
+        plot_args (dict): Arguments of plot_peptide_traces that are shared by all proteins.
+        output_file (str): Path of the pdf report or of an existing folder for the report.
+        page_height (int): Height of the report pages.
+        n_processes (int, optional): Number of processes to build and export the figures. Default is 'None' for one process per cpu core.
+        progress_callback (function, optional): Function that is called with the number of finished and the total number of proteins. Default is 'None'.
+    Returns:
+        str: Path of the pdf report.
+
+    """
+    report_key = get_report_key(proteins, plot_args, page_height)
+    if os.path.isdir(output_file):
+        output_file = os.path.join(output_file, f'alphamap_report_{report_key}.pdf')
+    with _report_locks[os.path.abspath(output_file)]:
+        if os.path.isfile(output_file) and os.path.basename(output_file) == f'alphamap_report_{report_key}.pdf':
+            # a finished report that is named after the key has the same pages
+            if progress_callback is not None:
+                progress_callback(len(proteins), len(proteins))
+            return output_file
+        return _stream_pdf_report(proteins, plot_args, output_file, page_height, report_key,
+                                  n_processes, progress_callback)
+
+def _stream_pdf_report(proteins, plot_args, output_file, page_height, report_key, n_processes, progress_callback):
+    parts_dir = output_file + '.parts'
+    key_file = os.path.join(parts_dir, 'report.json')
+    previous_key = None
+    if os.path.isfile(key_file):
+        with open(key_file) as f:
+            previous_key = json.load(f).get('key')
+    # the pages of a report with other proteins or options are removed
+    if os.path.isdir(parts_dir) and previous_key != report_key:
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir, exist_ok=True)
+    with open(key_file, 'w') as f:
+        json.dump({'key': report_key, 'n_proteins': len(proteins)}, f)
+
+    part_files = [os.path.join(parts_dir, f'{i:06d}.pdf') for i in range(len(proteins))]
+    missing = [i for i in range(len(proteins)) if not os.path.isfile(part_files[i])]
+    n_done = len(proteins) - len(missing)
+    if progress_callback is not None:
+        progress_callback(n_done, len(proteins))
+
+    for i, plot in zip(missing, export_report_figures([proteins[i] for i in missing], plot_args, n_processes=n_processes)):
+        page_buf = BytesIO()
+        page = canvas.Canvas(page_buf, pagesize=(1600,page_height))
+        draw_content(page, plot, width=1600, height=page_height,
+                     spacing=5, border=20)
+        draw_static_content(page, report_footer_text, width=1600, height=100,
+                            spacing=20, border=30)
+        page.showPage()
+        page.save()
+        # a page is only complete once it is renamed, so an interrupted write is rendered again
+        with open(part_files[i] + '.tmp', 'wb') as f:
+            f.write(page_buf.getvalue())
+        os.replace(part_files[i] + '.tmp', part_files[i])
+        n_done += 1
+        if progress_callback is not None:
+            progress_callback(n_done, len(proteins))
+
+    with open(output_file + '.tmp', 'wb') as f:
+        writer = StreamingPdfWriter(f)
+        for part_file in part_files:
+            for page in PdfReader(part_file).pages:
+                writer.add_page(page)
+        writer.close()
+    os.replace(output_file + '.tmp', output_file)
+    shutil.rmtree(parts_dir)
+    return output_file
+
+def remove_old_reports(report_dir: str, max_age: float = 24*3600, reports: list = None):
+    """
+    Function to remove the pdf reports of a report folder together with the pages of unfinished reports.
+    Reports that are written at the moment are kept.
+
+    Args:
+        report_dir (str): Folder of the reports, see stream_pdf_report.
+        max_age (float, optional): Age in seconds since the last change of a report after which it is removed. Default is one day.
+        reports (list, optional): Paths of reports that are removed regardless of their age. Default is 'None'.
+    Returns:
+        list: Paths of the removed files and folders.
+
+    """
+    reports = [os.path.abspath(report) for report in (reports or [])]
+    removed = []
+    if not os.path.isdir(report_dir):
+        return removed
+    now = time.time()
+    for file_name in sorted(os.listdir(report_dir)):
+        if not file_name.startswith('alphamap_report_') or '.pdf' not in file_name:
+            continue
+        path = os.path.join(report_dir, file_name)
+        # the pages and the temporary file of a report belong to the report file
+        output_file = os.path.abspath(path[:path.rindex('.pdf') + 4])
+        lock = _report_locks[output_file]
+        if not lock.acquire(blocking=False):
+            continue
+        try:
+            if output_file in reports or now - os.path.getmtime(path) > max_age:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed.append(path)
+        except OSError:
+            # a report that is opened by another process is removed by a later call
+            pass
+        finally:
+            lock.release()
+    return removed
 
 def create_pdf_report(proteins: list,
                       df: pd.DataFrame or list,
@@ -662,7 +1155,10 @@ def create_pdf_report(proteins: list,
                       uniprot_feature_dict: dict,
                       uniprot_color_dict: dict,
                       selected_proteases: list = [],
-                      trace_colors: list = []):
+                      trace_colors: list = [],
+                      n_processes: int = None,
+                      output_file: str = None,
+                      progress_callback = None):
     """
     Function to write pdf reports for selected proteins
 
@@ -677,9 +1173,12 @@ def create_pdf_report(proteins: list,
         uniprot_color_dict (dict): Uniprot color dictionary.
         selected_proteases (list, optional): List of proteases to plot. Default is an empty list.
         trace_colors (list, optional): List of manualy selected colors for each dataset in df. Default is an empty list.
+        n_processes (int, optional): Number of processes to build and export the figures of a list of proteins. Default is 'None' for one process per cpu core.
+        output_file (str, optional): Path of a pdf file or folder to which the report of a list of proteins is streamed page by page, see stream_pdf_report. Default is 'None' to write the report to memory.
+        progress_callback (function, optional): Function that is called with the number of finished and the total number of proteins if the report is streamed to output_file. Default is 'None'.
 
     Returns:
-        BytesIO: BytesIO object for writing a pdf report.
+        BytesIO/str: BytesIO object for writing a pdf report, or the path of the pdf report if output_file is set.
     """
 
     if isinstance(df, pd.DataFrame):
@@ -691,23 +1190,27 @@ def create_pdf_report(proteins: list,
     if max_height < 700:
         max_height = 700
 
-    footer_text = '<font size="20">This report was generated by <a href="https://github.com/MannLabs/alphamap" color="darkblue"><b>AlphaMap</b></a>.</font>'
+    plot_args = dict(df=df, name=name, fasta=fasta, uniprot=uniprot,
+                     selected_features=selected_features,
+                     uniprot_feature_dict=uniprot_feature_dict,
+                     uniprot_color_dict=uniprot_color_dict,
+                     selected_proteases=selected_proteases,
+                     trace_colors=trace_colors)
+
+    if isinstance(proteins, list) and output_file is not None:
+        return stream_pdf_report(proteins, plot_args, output_file, page_height=max_height,
+                                 n_processes=n_processes, progress_callback=progress_callback)
 
     pdf_buf = BytesIO()
     pdf_report = canvas.Canvas(pdf_buf, pagesize=(1600,max_height))
 
     if isinstance(proteins, list):
-        for p in range(0,len(proteins)):
-            plot = plot_peptide_traces(df=df, name=name, protein=proteins[p], fasta=fasta,
-                                       uniprot=uniprot, selected_features=selected_features,
-                                       uniprot_feature_dict=uniprot_feature_dict,
-                                       uniprot_color_dict=uniprot_color_dict,
-                                       selected_proteases=selected_proteases,
-                                       trace_colors=trace_colors)
+        # the pages are drawn in the order of the proteins while the next figures are exported
+        for plot in export_report_figures(proteins, plot_args, n_processes=n_processes):
             draw_content(pdf_report, plot, width=1600, height=max_height,
                          spacing=5, border=20)
-            draw_content(pdf_report, footer_text, width=1600, height=100,
-                         spacing=20, border=30)
+            draw_static_content(pdf_report, report_footer_text, width=1600, height=100,
+                                spacing=20, border=30)
             pdf_report.showPage()
     else:
         plot = plot_peptide_traces(df=df, name=name, protein=proteins, fasta=fasta,
@@ -718,7 +1221,7 @@ def create_pdf_report(proteins: list,
                                    trace_colors=trace_colors)
         draw_content(pdf_report, plot, width=1600, height=max_height,
                          spacing=20, border=30)
-        draw_content(pdf_report, footer_text, width=1600, height=100,
+        draw_content(pdf_report, report_footer_text, width=1600, height=100,
                          spacing=20, border=30)
         pdf_report.showPage()
 
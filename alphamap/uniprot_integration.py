@@ -1,7 +1,11 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/Uniprot_integration.ipynb (unless otherwise specified).
 
-__all__ = ['extract_note', 'extract_note_end', 'resolve_unclear_position', 'extract_positions', 'preprocess_uniprot',
-           'uniprot_feature_dict']
+__all__ = ['extract_note', 'extract_note_end', 'resolve_unclear_position', 'extract_positions', 'find_uniprot_entries',
+           'split_uniprot_entries', 'read_uniprot_blocks', 'read_uniprot_entries', 'parse_position', 'parse_note',
+           'parse_uniprot_entries', 'get_uniprot_shards', 'parse_uniprot_file_parallel', 'format_uniprot_columns',
+           'preprocess_uniprot', 'uniprot_feature_regex', 'uniprot_accession_regex', 'uniprot_note_regex',
+           'get_uniprot_entry_checksum', 'get_uniprot_checksum_file', 'update_uniprot_annotation',
+           'uniprot_version_regex', 'uniprot_feature_dict']
 
 # Cell
 import re
@@ -92,7 +96,315 @@ def extract_positions(posit_string: str):
     return isoform, start, end
 
 # Cell
-def preprocess_uniprot(path_to_file: str):
+import os
+import gzip
+from array import array
+from itertools import repeat
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# the features are matched with their qualifier lines, a note in one line directly after the feature key is captured
+uniprot_feature_regex = re.compile(rb'\nFT   (\S+) +(\S*)(?:\nFT +/note="([^"\n]+)")?((?:\nFT    [^\n]*)*)')
+uniprot_accession_regex = re.compile(rb'[^;\s]+')
+uniprot_note_regex = re.compile(rb'\nFT +/note="')
+
+def find_uniprot_entries(block: bytes, start: int = 0, end: int = None):
+    """
+    Find the first accession and the feature table of every Uniprot entry in a block of a flat text file.
+    Only the 'AC' lines and the feature table are looked at, all other lines are skipped by bytes.find.
+
+    Args:
+        block (bytes): Text of complete entries, every line starts after a line break.
+        start (int, optional): Position of the first entry in the block. Default is 0.
+        end (int, optional): Position after the last entry end '//' in the block. Default is 'None' for the block end.
+    Returns:
+        generator: Tuples of the accession as bytes, the start and end position of the entry
+        and the start and end position of its feature table, which are equal if the entry has no features.
+    """
+    if end is None:
+        end = len(block)
+    while start < end:
+        entry_end = block.find(b'\n//', start, end)
+        if entry_end < 0:
+            entry_end = end
+        accession = block.find(b'\nAC   ', start, entry_end)
+        if accession >= 0:
+            accession = uniprot_accession_regex.match(block, accession+6).group()
+            feature_table = feature_table_end = block.find(b'\nFT   ', start, entry_end)
+            if feature_table >= 0:
+                # the feature table is followed by the sequence
+                feature_table_end = block.find(b'\nSQ   ', feature_table, entry_end)
+                if feature_table_end < 0:
+                    feature_table_end = entry_end
+            else:
+                feature_table = feature_table_end = entry_end
+            yield accession, start, entry_end, feature_table, feature_table_end
+        start = entry_end + 3
+
+def split_uniprot_entries(block: bytes, start: int = 0, end: int = None):
+    """
+    Find the first accession and the features of every Uniprot entry in a block of a flat text file.
+
+    Args:
+        block (bytes): Text of complete entries, every line starts after a line break.
+        start (int, optional): Position of the first entry in the block. Default is 0.
+        end (int, optional): Position after the last entry end '//' in the block. Default is 'None' for the block end.
+    Returns:
+        generator: Tuples of the accession as bytes and the features as tuples of feature key, location,
+        note in one line and other qualifier lines, matched by uniprot_feature_regex.
+    """
+    for accession, _, _, feature_table, feature_table_end in find_uniprot_entries(block, start, end):
+        yield accession, uniprot_feature_regex.findall(block, feature_table, feature_table_end)
+
+def read_uniprot_blocks(path_to_file: str, block_size: int = 1 << 24, start: int = 0, end: int = None):
+    """
+    Read a Uniprot flat text file, which can be gzip compressed, in blocks that are split at the ends of the entries.
+
+    Args:
+        path_to_file (str): Path to a .txt or .txt.gz annotation file directly downloaded from uniprot.
+        block_size (int, optional): Number of bytes that are read at once. Default is 16 MB.
+        start (int, optional): Byte position in the file at which the first entry starts. Default is 0.
+        end (int, optional): Byte position in the file after the last entry end '//'. Default is 'None' for the file end.
+    Returns:
+        generator: Tuples of a block and the position after its last entry end '//'.
+    """
+    opener = gzip.open if path_to_file.endswith('.gz') else open
+    with opener(path_to_file, 'rb') as f:
+        f.seek(start)
+        position = start
+        # every line starts after a line break
+        rest = b'\n'
+        while end is None or position < end:
+            block = f.read(block_size if end is None else min(block_size, end - position))
+            if not block:
+                break
+            position += len(block)
+            block = rest + block
+            # the entry that is cut by the block end is parsed with the next block
+            cut = block.rfind(b'\n//')
+            if cut < 0:
+                rest = block
+                continue
+            rest = block[cut+3:]
+            yield block, cut+3
+        yield rest, len(rest)
+
+def read_uniprot_entries(path_to_file: str, block_size: int = 1 << 24, start: int = 0, end: int = None):
+    """
+    Read the first accession and the features of every entry of a Uniprot flat text file, which can be gzip compressed.
+
+    Args:
+        path_to_file (str): Path to a .txt or .txt.gz annotation file directly downloaded from uniprot.
+        block_size (int, optional): Number of bytes that are read at once. Default is 16 MB.
+        start (int, optional): Byte position in the file at which the first entry starts. Default is 0.
+        end (int, optional): Byte position in the file after the last entry end '//'. Default is 'None' for the file end.
+    Returns:
+        generator: Entries as returned by split_uniprot_entries.
+    """
+    for block, block_end in read_uniprot_blocks(path_to_file, block_size, start, end):
+        yield from split_uniprot_entries(block, 0, block_end)
+
+def parse_position(value: bytes):
+    """
+    Convert a start or end position of a Uniprot feature to float, unclear positions are resolved by resolve_unclear_position.
+
+    Args:
+        value (bytes): Uniprot position.
+    Returns:
+        float: Resolved sequence position, np.nan if the position is empty.
+    """
+    if value.isdigit():
+        return float(value)
+    if not value:
+        return np.nan
+    return resolve_unclear_position(value.decode())
+
+def parse_note(qualifiers: bytes, note_start: int):
+    """
+    Extract the note of a Uniprot feature from its qualifier lines, also if the note is splitted into several lines.
+
+    Args:
+        qualifiers (bytes): Qualifier lines of the feature.
+        note_start (int): Position of the note text after '/note="'.
+    Returns:
+        str: The note, None if the note is not closed.
+    """
+    line_end = qualifiers.find(b'\n', note_start)
+    if line_end < 0:
+        line_end = len(qualifiers)
+    text = qualifiers[note_start:line_end].rstrip()
+    note_end = text.find(b'"', 1)
+    if note_end > 0:
+        return text[:note_end].decode()
+    combined_note = [text]
+    for line in qualifiers[line_end+1:].split(b'\n'):
+        text = line[2:].strip()
+        if text.endswith(b'"'):
+            # if it's the final part of the note
+            combined_note.append(text[:-1])
+            return b' '.join(combined_note).decode()
+        combined_note.append(text)
+    return None
+
+def parse_uniprot_entries(entries):
+    """
+    Parse the features of the entries of a Uniprot flat text file into typed columns.
+
+    Args:
+        entries (iterable): Entries as returned by read_uniprot_entries.
+    Returns:
+        dict: Lists of protein_id, feature, isoform_id and note and float arrays of start and end.
+    """
+    columns = {'protein_id': [], 'feature': [], 'isoform_id': [],
+               'start': array('d'), 'end': array('d'), 'note': []}
+    add_protein_id = columns['protein_id'].append
+    add_feature = columns['feature'].append
+    add_isoform_id = columns['isoform_id'].append
+    add_start = columns['start'].append
+    add_end = columns['end'].append
+    add_note = columns['note'].append
+
+    # the feature and isoform names are decoded once
+    names = {b'': ''}
+
+    for protein_id, features in entries:
+        protein_id = protein_id.decode()
+        for feature, location, note, qualifiers in features:
+            if not location:
+                continue
+            if note:
+                # the note is the first qualifier and written in one line
+                notes = (note.decode(),)
+            elif qualifiers:
+                notes = []
+                match = uniprot_note_regex.search(qualifiers)
+                if match is None or match.start() > 0:
+                    # in case when the instance has other information before the note or no note
+                    notes.append('')
+                if match is not None:
+                    note = parse_note(qualifiers, match.end())
+                    if note is not None:
+                        notes.append(note)
+            else:
+                # the features without any qualifier are skipped
+                continue
+            if feature not in names:
+                names[feature] = feature.decode()
+            isoform, _, location = location.rpartition(b':')
+            if isoform not in names:
+                names[isoform] = isoform.decode()
+            start, _, end = location.partition(b'..')
+            start = float(start) if start.isdigit() else parse_position(start)
+            end = float(end) if end.isdigit() else parse_position(end)
+            for note in notes:
+                add_protein_id(protein_id)
+                add_feature(names[feature])
+                add_isoform_id(names[isoform])
+                add_start(start)
+                add_end(end)
+                add_note(note)
+
+    return columns
+
+def get_uniprot_shards(path_to_file: str, n_shards: int):
+    """
+    Split an uncompressed Uniprot flat text file into byte ranges of about the same size that end after an entry end '//'.
+
+    Args:
+        path_to_file (str): Path to a .txt annotation file directly downloaded from uniprot.
+        n_shards (int): Number of byte ranges.
+    Returns:
+        list: Tuples of the start and the end position of the byte ranges in the file.
+    """
+    file_size = os.path.getsize(path_to_file)
+    bounds = [0]
+    with open(path_to_file, 'rb') as f:
+        for i in range(1, n_shards):
+            position = max(file_size * i // n_shards, bounds[-1])
+            f.seek(position)
+            # the range ends after the next entry end, an entry end that is cut by the read is found by the next read
+            rest = b''
+            while True:
+                block = f.read(1 << 20)
+                if not block:
+                    bound = file_size
+                    break
+                entry_end = (rest + block).find(b'\n//')
+                if entry_end >= 0:
+                    bound = position - len(rest) + entry_end + 3
+                    break
+                position += len(block)
+                rest = block[-2:]
+            bounds.append(bound)
+    bounds.append(file_size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def _parse_uniprot_shard(path_to_file: str, start: int, end: int):
+    return parse_uniprot_entries(read_uniprot_entries(path_to_file, start=start, end=end))
+
+def _parse_uniprot_block(block: bytes):
+    return parse_uniprot_entries(split_uniprot_entries(block))
+
+def _parse_uniprot_blocks(executor, path_to_file: str, n_pending: int):
+    # only a few blocks are decompressed ahead of the processes to limit the memory
+    pending = deque()
+    for block, block_end in read_uniprot_blocks(path_to_file):
+        pending.append(executor.submit(_parse_uniprot_block, block[:block_end]))
+        if len(pending) > n_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def parse_uniprot_file_parallel(path_to_file: str, n_processes: int = None):
+    """
+    Parse the features of a Uniprot flat text file in a process pool, the results are concatenated in the order of the file.
+    An uncompressed file is split into byte ranges by get_uniprot_shards, which are read by the processes.
+    A gzip compressed file can't be split, it is decompressed in blocks that are sent to the processes.
+
+    Args:
+        path_to_file (str): Path to a .txt or .txt.gz annotation file directly downloaded from uniprot.
+        n_processes (int, optional): Number of processes. Default is 'None' for one process per cpu core.
+    Returns:
+        dict: Lists of protein_id, feature, isoform_id and note and float arrays of start and end.
+    """
+    if n_processes is None:
+        n_processes = os.cpu_count()
+    columns = parse_uniprot_entries([])
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+        if path_to_file.endswith('.gz'):
+            results = _parse_uniprot_blocks(executor, path_to_file, 2 * n_processes)
+        else:
+            # more ranges than processes, so a process that finishes early takes the next range
+            shards = get_uniprot_shards(path_to_file, 4 * n_processes)
+            results = executor.map(_parse_uniprot_shard, repeat(path_to_file),
+                                   [start for start, end in shards], [end for start, end in shards])
+        for result in results:
+            for key in columns:
+                columns[key].extend(result[key])
+    return columns
+
+def format_uniprot_columns(columns: dict):
+    """
+    Create the dataframe of the preprocessed Uniprot data from the typed columns of parse_uniprot_entries.
+
+    Args:
+        columns (dict): Lists of protein_id, feature, isoform_id and note and float arrays of start and end.
+    Returns:
+        pd.DataFrame: Dataframe with formatted uniprot annotations for alphamap.
+    """
+    # create a dataframe for preprocessed data
+    uniprot_df = pd.DataFrame({'protein_id': columns['protein_id'],
+                               'feature': pd.Categorical(columns['feature']),
+                               'isoform_id': columns['isoform_id'],
+                               'start': np.frombuffer(columns['start'], dtype=np.float64),
+                               'end': np.frombuffer(columns['end'], dtype=np.float64),
+                               'note': columns['note']})
+    # to filter the instances that don't have a defined start/end position(start=-1 or end=-1)
+    uniprot_df = uniprot_df[(uniprot_df.start != -1) & (uniprot_df.end != -1)].reset_index(drop=True)
+
+    return uniprot_df
+
+def preprocess_uniprot(path_to_file: str, n_processes: int = 1):
     """
     A complex complete function to preprocess Uniprot data from specifying the path to a flat text file
     to the returning a dataframe containing information about:
@@ -104,71 +416,113 @@ def preprocess_uniprot(path_to_file: str):
         - note information(str)
 
     Args:
-        path_to_file (str): Path to a .txt annotation file directly downloaded from uniprot.
+        path_to_file (str): Path to a .txt or .txt.gz annotation file directly downloaded from uniprot.
+        n_processes (int, optional): Number of processes to parse the file, see parse_uniprot_file_parallel.
+            Default is 1 to parse the file in this process, 'None' for one process per cpu core.
     Returns:
         pd.DataFrame: Dataframe with formatted uniprot annotations for alphamap.
 
     """
-    all_data = []
-    with open(path_to_file) as f:
-
-        is_splitted = False
-        new_instance = False
-        combined_note = []
-        line_type = ''
-
-        for line in f:
-
-            if line.startswith(('AC', 'FT')):
-                if is_splitted:
-                    # in case when the note information is splitted into several lines
-                    if line.rstrip().endswith('"'):
-                        # if it's the final part of the note
-                        combined_note.extend(extract_note_end(line))
-                        all_data.append([protein_id, feature, isoform, start, end, " ".join(combined_note)])
-                        is_splitted = False
-                        new_instance = False
-                    else:
-                        # if it's the middle part of the note
-                        combined_note.extend(extract_note_end(line, has_mark=False))
-                elif line.startswith('AC'):
-                    # contains the protein_id information
-                    if line_type != 'AC':
-                        # to prevent a situation when the protein has several AC lines with different names
-                        # in this case we are taking the first name in the first line
-                        protein_id = line.split()[1].replace(';', '')
-                    line_type = 'AC'
-                elif line.startswith('FT'):
-                    line_type = 'FT'
-                    # contains all modifications/preprocessing events/etc., their positions, notes
-                    data = line.split()
-                    if data[1].isupper() and not data[1].startswith('ECO'):
-                            feature = data[1]
-                            isoform, start, end = extract_positions(data[2])
-                            new_instance = True
-                    else:
-                        if data[1].startswith('/note'):
-                            note = extract_note(line)
-                            if note:
-                                # if note was created > it contains just one line and can be already added to the data
-                                all_data.append([protein_id, feature, isoform, start, end, note[0]])
-                                new_instance = False
-                            else:
-                                # if note is empty > it's splitted into several lines and we create combined_note
-                                combined_note = extract_note(line, splitted=True)
-                                is_splitted = True
-                        else:
-                            if new_instance:
-                                # in case when we don't have any note but need to add other information about instance
-                                all_data.append([protein_id, feature, isoform, start, end, ''])
-                                new_instance = False
+    if n_processes is not None and n_processes <= 1:
+        columns = parse_uniprot_entries(read_uniprot_entries(path_to_file))
+    else:
+        columns = parse_uniprot_file_parallel(path_to_file, n_processes)
+    return format_uniprot_columns(columns)
 
-    # create a dataframe for preprocessed data
-    uniprot_df = pd.DataFrame(all_data, columns=['protein_id', 'feature', 'isoform_id', 'start', 'end', 'note'])
-    # change the dtypes of the columns
-    uniprot_df.feature = uniprot_df.feature.astype('category')
-    # to filter the instances that don't have a defined start/end position(start=-1 or end=-1)
-    uniprot_df = uniprot_df[(uniprot_df.start != -1) & (uniprot_df.end != -1)].reset_index(drop=True)
+# Cell
+import hashlib
+
+uniprot_version_regex = re.compile(rb', sequence version (\d+)')
+
+def get_uniprot_entry_checksum(block: bytes, entry_start: int, entry_end: int, feature_table: int, feature_table_end: int):
+    """
+    Get the sequence version and the checksum of the feature table of a Uniprot entry.
+
+    Args:
+        block (bytes): Text of complete entries.
+        entry_start (int): Start position of the entry in the block.
+        entry_end (int): End position of the entry in the block.
+        feature_table (int): Start position of the feature table of the entry in the block.
+        feature_table_end (int): End position of the feature table of the entry in the block.
+    Returns:
+        (int, str): The sequence version, 0 if it is missing, and the hex digest of the feature table.
+    """
+    version = uniprot_version_regex.search(block, entry_start, entry_end)
+    version = int(version.group(1)) if version else 0
+    checksum = hashlib.blake2b(memoryview(block)[feature_table:feature_table_end], digest_size=8).hexdigest()
+    return version, checksum
+
+def get_uniprot_checksum_file(uniprot_file: str):
+    """
+    Get the name of the file with the entry checksums of a preprocessed uniprot annotation csv file.
+
+    Args:
+        uniprot_file (str): Path to the csv file.
+    Returns:
+        str: The path to the checksum file.
+    """
+    return uniprot_file + '.alphamap_checksums.csv'
+
+def update_uniprot_annotation(uniprot_file: str, path_to_file: str, complete: bool = True):
+    """
+    Update a preprocessed uniprot annotation csv file from a new Uniprot flat text file.
+    Only the entries whose sequence version or feature table changed are parsed again, they replace the rows of their
+    protein in the csv file and keep its position in the table. The csv file and its checksums are created from the whole flat file if they don't exist.
+
+    Args:
+        uniprot_file (str): Path to the csv file with the preprocessed uniprot annotation.
+        path_to_file (str): Path to a .txt or .txt.gz annotation file directly downloaded from uniprot.
+        complete (bool, optional): Flag if the flat file contains all entries, the proteins that are missing in it are removed.
+            Set it to 'False' for a file with only the changed entries. Default is 'True'.
+    Returns:
+        pd.DataFrame: The updated uniprot annotation.
+    """
+    checksum_file = get_uniprot_checksum_file(uniprot_file)
+    stored_checksums = {}
+    uniprot_df = None
+    if os.path.isfile(uniprot_file) and os.path.isfile(checksum_file):
+        checksum_df = pd.read_csv(checksum_file, dtype={'protein_id': str, 'sequence_version': int, 'checksum': str})
+        stored_checksums = dict(zip(checksum_df.protein_id,
+                                    zip(checksum_df.sequence_version.tolist(), checksum_df.checksum)))
+        # empty isoform ids and notes are read as empty strings like in the parsed entries, only unknown positions are NaN
+        uniprot_df = pd.read_csv(uniprot_file, keep_default_na=False, na_values={'start': [''], 'end': ['']},
+                                 dtype={'protein_id': str, 'feature': str, 'isoform_id': str,
+                                        'start': np.float64, 'end': np.float64, 'note': str})
+
+    checksums = {}
+    changed_entries = []
+    for block, block_end in read_uniprot_blocks(path_to_file):
+        for accession, entry_start, entry_end, feature_table, feature_table_end in find_uniprot_entries(block, 0, block_end):
+            protein_id = accession.decode()
+            checksums[protein_id] = get_uniprot_entry_checksum(block, entry_start, entry_end,
+                                                               feature_table, feature_table_end)
+            if stored_checksums.get(protein_id) != checksums[protein_id]:
+                changed_entries.append((accession, uniprot_feature_regex.findall(block, feature_table, feature_table_end)))
+
+    changed_proteins = set(protein_id.decode() for protein_id, _ in changed_entries)
+    removed_proteins = set(stored_checksums) - set(checksums) if complete else set()
+    changed_df = format_uniprot_columns(parse_uniprot_entries(changed_entries))
+    if uniprot_df is None:
+        uniprot_df = changed_df
+    else:
+        # the updated rows replace the rows of their protein at its position in the table, new proteins are appended
+        protein_order = pd.unique(pd.concat([uniprot_df.protein_id, changed_df.protein_id], ignore_index=True))
+        protein_order = pd.Series(np.arange(len(protein_order)), index=protein_order)
+        unchanged = ~uniprot_df.protein_id.isin(changed_proteins | removed_proteins)
+        uniprot_df = pd.concat([uniprot_df[unchanged], changed_df], ignore_index=True)
+        uniprot_df = uniprot_df.iloc[np.argsort(protein_order[uniprot_df.protein_id].values, kind='stable')].reset_index(drop=True)
+        uniprot_df['feature'] = uniprot_df.feature.astype('category')
+    if not complete:
+        checksums = dict(stored_checksums, **checksums)
+
+    # the files are renamed only after they are written completely, so an interrupted update never leaves a broken table
+    uniprot_df.to_csv(uniprot_file + '.tmp', index=False)
+    pd.DataFrame({'protein_id': list(checksums.keys()),
+                  'sequence_version': [version for version, _ in checksums.values()],
+                  'checksum': [checksum for _, checksum in checksums.values()]}).to_csv(checksum_file + '.tmp', index=False)
+    os.replace(uniprot_file + '.tmp', uniprot_file)
+    os.replace(checksum_file + '.tmp', checksum_file)
+    print(f"{len(changed_proteins)} entries were updated and {len(removed_proteins)} entries were removed.")
 
     return uniprot_df
 